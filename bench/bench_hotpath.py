@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+受信フレームごとの処理 (ホットパス) のマイクロベンチマーク
+各関数を単独で繰り返し実行し、1回あたりの時間 (ns/op) とメモリ割り当てを計測する
+
+メモリ割り当ては tracemalloc で次の2つを計測する
+    peak_alloc_bytes_per_op : 1回の呼び出し中に一時的に確保されたバイト数 (ピークの増分の平均)
+    retained_blocks_per_op  : 呼び出し後も解放されずに残ったメモリブロック数 (リーク・キャッシュの増加)
+
+使い方:
+    python bench/bench_hotpath.py [--iterations 100000] [--repeat 5] [--filter parse]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import logging
+import os
+import socket
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bridge import WebSocketOSCBridge
+from channel_state import CHANNEL_COUNT
+from config import Config
+from osc_client import OSCClient
+from websocket_server import WebSocketServer
+
+FRAME = "a:0.52;b:0.31;c:0.9"
+# tracemalloc のピーク計測で呼び出す回数
+PEAK_SAMPLES = 200
+
+
+class StubOSCClient:
+    """送信せずに成功を返すOSCクライアント (ブリッジの処理だけを計測する)"""
+
+    use_bundle = False
+
+    def is_connected(self) -> bool:
+        return True
+
+    def send_masked_values(self, mask: int, values) -> bool:
+        return True
+
+    def send_multiple_values(self, channel_values) -> bool:
+        return True
+
+    def disconnect(self) -> None:
+        pass
+
+
+def run_coroutine(coroutine) -> None:
+    """await しないコルーチンをイベントループなしで実行"""
+    try:
+        coroutine.send(None)
+    except StopIteration:
+        pass
+    else:
+        raise RuntimeError("コルーチンが中断しました (ベンチマーク対象が await しています)")
+
+
+def measure(func, iterations: int, repeat: int) -> dict:
+    """ns/op (最速の回) とメモリ割り当てを計測"""
+    # ウォームアップ (キャッシュ・テンプレートの生成を計測から除く)
+    for _ in range(min(iterations, 1000)):
+        func()
+
+    best = None
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            for _ in range(iterations):
+                func()
+            elapsed = time.perf_counter_ns() - start
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        peak_total = 0
+        for _ in range(PEAK_SAMPLES):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+            peak_total += peak - current
+        gc.collect()
+        before = tracemalloc.take_snapshot()
+        count = min(iterations, 10000)
+        for _ in range(count):
+            func()
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+        retained = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'ns_per_op': round(best / iterations, 1),
+        'peak_alloc_bytes_per_op': round(peak_total / PEAK_SAMPLES, 1),
+        # スナップショット自体の確保分を含むため、小さな値は誤差
+        'retained_blocks_per_op': round(retained / count, 3),
+    }
+
+
+def create_config(directory: str) -> str:
+    path = os.path.join(directory, "config.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'tag_channel_map': {"a": 0, "b": 1, "c": 3}, 'osc_ip': "127.0.0.1"}, f)
+    return path
+
+
+def build_benchmarks(config_file: str, sink_port: int, resources: contextlib.ExitStack) -> dict:
+    """計測対象 {名前: 引数なしの関数} (作成したループ・ソケットは resources で閉じる)"""
+    config = Config(config_file)
+    server = WebSocketServer()
+    server.set_channel_handler(config, None)
+    values = array('f', bytes(4 * CHANNEL_COUNT))
+
+    bridge = WebSocketOSCBridge(config_file)
+    # 設定から作成したOSCクライアントのソケットを閉じてからスタブに置き換える
+    bridge.osc_client.disconnect()
+    bridge.osc_client = StubOSCClient()
+    # 動作中と同じくタイムアウト期限の延長 (ウォッチドッグ) も計測する。
+    # ループは実行しないため、登録したタイマーは発火しない
+    loop = asyncio.new_event_loop()
+    resources.callback(loop.close)
+    bridge.loop = loop
+    bridge.is_running = True
+    # 送信抑制で2回目以降が送信されなくならないよう、毎回異なる値を送る
+    bridge_frames = [{"a": 0.5, "b": 0.25 + i / 1000, "c": 0.9} for i in range(2)]
+    channel_values = [array('f', values) for _ in range(2)]
+    for index, frame_values in enumerate(channel_values):
+        frame_values[0], frame_values[1], frame_values[3] = 0.5, 0.25 + index / 1000, 0.9
+    frame_index = [0]
+
+    def handle_websocket_message():
+        frame_index[0] ^= 1
+        run_coroutine(bridge.handle_websocket_message(bridge_frames[frame_index[0]]))
+
+    def handle_channel_values():
+        frame_index[0] ^= 1
+        run_coroutine(bridge.handle_channel_values(0b1011, channel_values[frame_index[0]]))
+
+    osc_client = OSCClient("127.0.0.1", sink_port)
+    resources.callback(osc_client.disconnect)
+    send_values = array('f', values)
+    send_values[0], send_values[1], send_values[3] = 0.5, 0.25, 0.9
+
+    return {
+        'parse_message': lambda: server.parse_message(FRAME),
+        'parse_channels': lambda: server.parse_channels(FRAME, values),
+        'get_channel_for_tag': lambda: config.get_channel_for_tag("b"),
+        'handle_websocket_message': handle_websocket_message,
+        'handle_channel_values': handle_channel_values,
+        'send_haptic_value': lambda: osc_client.send_haptic_value(1, 0.5),
+        'send_masked_values_3ch': lambda: osc_client.send_masked_values(0b1011, send_values),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ホットパスのマイクロベンチマーク")
+    parser.add_argument('--iterations', type=int, default=100000, help="1回の計測での呼び出し回数")
+    parser.add_argument('--repeat', type=int, default=5, help="計測回数 (最速の回を採用)")
+    parser.add_argument('--filter', default="", help="名前にこの文字列を含むものだけ計測")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, contextlib.ExitStack() as resources:
+        config_file = create_config(directory)
+        # 設定読み込みのメッセージでJSON出力が乱れないよう標準エラーへ
+        with contextlib.redirect_stdout(sys.stderr):
+            benchmarks = build_benchmarks(config_file, sink.getsockname()[1], resources)
+        for name, func in benchmarks.items():
+            if args.filter in name:
+                results[name] = measure(func, args.iterations, args.repeat)
+    sink.close()
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
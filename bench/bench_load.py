@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+負荷試験ハーネス
+WebSocketOSCBridge をGUIなしで起動し、ループバック上で N 個のWebSocketクライアントから
+指定したタグ・レートで送信して、OSCを受信するUDPシンクで到着時刻を記録する。
+持続フレーム数/秒・OSCパケット数/秒・欠落率・遅延のパーセンタイルをJSONで出力する。
+
+遅延は、送信する値をフレームごとに一意にし (n / 65535)、シンクに届いた
+(チャンネル, 値) を送信時刻と突き合わせて計測する。
+
+使い方:
+    python bench/bench_load.py [--clients 4] [--rate 100] [--duration 5] [--tags a,b,c]
+    python bench/bench_load.py --save-baseline   # 結果を bench/baseline.json に保存
+    python bench/bench_load.py --compare         # bench/baseline.json と比較 (劣化があれば終了コード1、負荷条件が違えば2)
+    python bench/bench_load.py --loop uvloop     # ブリッジ・クライアントのイベントループを指定
+    python bench/bench_load.py --compare-loops   # asyncio と uvloop (インストール済みの場合) で同じ負荷を比較
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets
+
+import event_loop
+from bridge import WebSocketOSCBridge
+from channel_state import CHANNEL_COUNT
+from websocket_server import BINARY_UINT16, encode_binary_frame
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# 値の分解能 (uint16 と同じ)。送信する値は 1/65535 - 65535/65535 を順に使う
+VALUE_STEPS = 65535
+# 比較する指標と、大きい方が良いか
+COMPARED_METRICS = {
+    'frames_per_sec': True,
+    'osc_packets_per_sec': True,
+    'drop_rate': False,
+    'latency_p50_ms': False,
+    'latency_p99_ms': False,
+}
+# 小さい方が良い指標で劣化とみなす最小の増加量 (ベースラインが0の場合もこの増加量で判定する)
+MIN_INCREASE = {
+    'drop_rate': 0.001,
+    'latency_p50_ms': 0.01,
+    'latency_p99_ms': 0.01,
+}
+# ベースラインと一致しなければ比較しない負荷条件
+WORKLOAD_KEYS = ('clients', 'rate_per_client', 'target_duration', 'tags', 'tags_per_frame', 'binary',
+                 'output_rate_hz', 'osc_bundle', 'event_loop')
+
+
+def to_float32(value: float) -> float:
+    """float32 に丸めた値 (ブリッジ内部の値と一致させる)"""
+    return array('f', (value,))[0]
+
+
+def free_port() -> int:
+    """空いているTCPポートを取得"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def decode_osc(data: bytes, out: list) -> None:
+    """OSCメッセージ・バンドルを (アドレス, float値) に分解 (ブリッジが送る ,f 形式のみ)"""
+    if data.startswith(b"#bundle\0"):
+        offset = 16
+        while offset < len(data):
+            size = struct.unpack_from(">i", data, offset)[0]
+            decode_osc(data[offset + 4:offset + 4 + size], out)
+            offset += 4 + size
+        return
+    end = data.index(b"\0")
+    address = data[:end].decode()
+    offset = (end + 4) & ~3
+    if data[offset:offset + 2] == b",f":
+        out.append((address, struct.unpack_from(">f", data, offset + 4)[0]))
+
+
+class OSCSink(asyncio.DatagramProtocol):
+    """OSCを受信して送信記録と突き合わせるUDPシンク"""
+
+    def __init__(self, sent: dict):
+        self.sent = sent
+        self.packets = 0
+        self.values = 0
+        self.latencies = []
+        self.recording = True
+
+    def datagram_received(self, data, addr):
+        now = time.perf_counter()
+        if not self.recording:
+            return
+        self.packets += 1
+        decoded = []
+        decode_osc(data, decoded)
+        for address, value in decoded:
+            # アドレス末尾の .../channel/XX/value からチャンネル番号を取得
+            channel = int(address.rsplit("/", 2)[-2])
+            sent_at = self.sent.pop((channel, value), None)
+            if sent_at is not None:
+                self.values += 1
+                self.latencies.append(now - sent_at)
+
+
+class BridgeThread:
+    """ブリッジを専用スレッドのイベントループで起動"""
+
+    def __init__(self, config_file: str):
+        # 設定読み込みのメッセージでJSON出力が乱れないよう標準エラーへ
+        with contextlib.redirect_stdout(sys.stderr):
+            self.bridge = WebSocketOSCBridge(config_file)
+        self.loop = event_loop.new_event_loop(self.bridge.config.event_loop)
+        self.thread = threading.Thread(target=self._run, name="bridge", daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.bridge.start())
+
+    def start(self, timeout: float = 5.0) -> None:
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.bridge.websocket_server.is_running:
+            if time.monotonic() > deadline:
+                raise RuntimeError("ブリッジの起動がタイムアウトしました")
+            time.sleep(0.01)
+
+    def status(self) -> dict:
+        return asyncio.run_coroutine_threadsafe(self._status(), self.loop).result()
+
+    async def _status(self) -> dict:
+        return self.bridge.get_status()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.bridge.stop(), self.loop).result()
+        self.thread.join(timeout=5)
+
+
+class LoadGenerator:
+    """フレームごとに一意な値を生成して送信時刻を記録"""
+
+    def __init__(self, tags: list, tag_channels: dict, tags_per_frame: int, binary: bool):
+        self.tags = tags
+        self.tag_channels = tag_channels
+        self.tags_per_frame = tags_per_frame
+        self.binary = binary
+        self.sent = {}
+        self.frames = 0
+        self.values = 0
+        self._counter = 0
+        self._tag_index = 0
+
+    def next_frame(self):
+        count = self.tags_per_frame
+        tags = [self.tags[(self._tag_index + i) % len(self.tags)] for i in range(count)]
+        self._tag_index = (self._tag_index + count) % len(self.tags)
+        now = time.perf_counter()
+        channel_values = {}
+        parts = []
+        for tag in tags:
+            self._counter = self._counter % VALUE_STEPS + 1
+            value = self._counter / VALUE_STEPS
+            channel = self.tag_channels[tag]
+            channel_values[channel] = value
+            parts.append(f"{tag}:{value!r}")
+            if self.binary:
+                key = to_float32(self._counter * (1.0 / VALUE_STEPS))
+            else:
+                key = to_float32(value)
+            self.sent[(channel, key)] = now
+        self.frames += 1
+        self.values += len(tags)
+        if self.binary:
+            return encode_binary_frame(channel_values, BINARY_UINT16)
+        return ";".join(parts)
+
+
+async def run_client(url: str, generator: LoadGenerator, rate: float, stop_at: float) -> None:
+    """1クライアント分の送信ループ (rate=0 は上限なし)"""
+    async with websockets.connect(url, max_queue=None) as websocket:
+        interval = 1.0 / rate if rate > 0 else 0.0
+        next_send = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            if interval:
+                if next_send > now:
+                    await asyncio.sleep(next_send - now)
+                next_send += interval
+            await websocket.send(generator.next_frame())
+            if not interval:
+                await asyncio.sleep(0)
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[int((len(ordered) - 1) * fraction)]
+
+
+async def run_load(args, config_file: str, ws_port: int, sink_socket: socket.socket) -> dict:
+    tags = args.tags.split(",")
+    tag_channels = {tag: index % CHANNEL_COUNT for index, tag in enumerate(tags)}
+    generator = LoadGenerator(tags, tag_channels, min(args.tags_per_frame or len(tags), len(tags)), args.binary)
+
+    loop = asyncio.get_running_loop()
+    sink = OSCSink(generator.sent)
+    transport, _ = await loop.create_datagram_endpoint(lambda: sink, sock=sink_socket)
+
+    bridge = BridgeThread(config_file)
+    bridge.start()
+    try:
+        url = f"ws://127.0.0.1:{ws_port}/haptic"
+        start = time.perf_counter()
+        stop_at = start + args.duration
+        await asyncio.gather(*(run_client(url, generator, args.rate, stop_at) for _ in range(args.clients)))
+        elapsed = time.perf_counter() - start
+        # 送信済みの値が届くのを待つ
+        await asyncio.sleep(args.settle)
+        sink.recording = False
+        status = bridge.status()
+    finally:
+        bridge.stop()
+        transport.close()
+
+    latencies = sorted(sink.latencies)
+    return {
+        'clients': args.clients,
+        'rate_per_client': args.rate,
+        'target_duration': args.duration,
+        'duration': round(elapsed, 3),
+        'tags': tags,
+        'tags_per_frame': generator.tags_per_frame,
+        'binary': args.binary,
+        'output_rate_hz': args.output_rate,
+        'osc_bundle': args.bundle,
+        'frames_sent': generator.frames,
+        'frames_per_sec': round(generator.frames / elapsed, 1),
+        'bridge_frames_received': status['frames_received'],
+        'coalesced_frames': status['coalesced_frames'],
+        'osc_packets': sink.packets,
+        'osc_packets_per_sec': round(sink.packets / elapsed, 1),
+        'values_sent': generator.values,
+        'values_received': sink.values,
+        'drop_rate': round(1 - sink.values / generator.values, 4) if generator.values else 0.0,
+        'latency_p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'latency_p90_ms': round(percentile(latencies, 0.90) * 1000, 3),
+        'latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'latency_max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        'bridge_latency': status['latency'],
+        'event_loop': status['event_loop'],
+    }
+
+
+def workload_mismatch(result: dict, baseline: dict) -> dict:
+    """負荷条件のうちベースラインと異なるもの ({key: {'baseline', 'current'}})"""
+    return {
+        key: {'baseline': baseline.get(key), 'current': result.get(key)}
+        for key in WORKLOAD_KEYS
+        if baseline.get(key) != result.get(key)
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float, min_increase: dict = MIN_INCREASE) -> dict:
+    """
+    ベースラインとの比較 (tolerance を超えて悪化した指標を regression とする)
+
+    小さい方が良い指標は min_increase 未満の増加を揺れとして無視する
+    """
+    comparison = {}
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        base = baseline.get(metric)
+        current = result.get(metric)
+        if base is None or current is None:
+            continue
+        if higher_is_better:
+            regression = current < base * (1 - tolerance)
+        else:
+            regression = current > base * (1 + tolerance) and current - base >= min_increase.get(metric, 0.0)
+        comparison[metric] = {
+            'baseline': base,
+            'current': current,
+            'change': round(current / base - 1, 4) if base else None,
+            'regression': regression,
+        }
+    return comparison
+
+
+def run_once(args, loop: str) -> dict:
+    """指定したイベントループでブリッジとクライアントを起動して1回計測"""
+    sink_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sink_socket.bind(("127.0.0.1", 0))
+    ws_port = free_port()
+    tags = args.tags.split(",")
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_file = os.path.join(directory, "config.json")
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'tag_channel_map': {tag: index % CHANNEL_COUNT for index, tag in enumerate(tags)},
+                'osc_ip': "127.0.0.1",
+                'osc_port': sink_socket.getsockname()[1],
+                'websocket_port': ws_port,
+                'output_rate_hz': args.output_rate,
+                'osc_bundle': args.bundle,
+                'max_clients': max(16, args.clients),
+                'event_loop': loop,
+            }, f)
+        return event_loop.run(run_load(args, config_file, ws_port, sink_socket), loop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket → OSC ブリッジの負荷試験")
+    parser.add_argument('--clients', type=int, default=4, help="同時接続クライアント数")
+    parser.add_argument('--rate', type=float, default=100.0, help="クライアントごとの送信レート (フレーム/秒, 0で上限なし)")
+    parser.add_argument('--duration', type=float, default=5.0, help="送信時間 (秒)")
+    parser.add_argument('--tags', default="a,b,c", help="送信するタグ (カンマ区切り, 順にチャンネル0から割り当て)")
+    parser.add_argument('--tags-per-frame', type=int, default=0, help="1フレームに含めるタグ数 (0で全タグ)")
+    parser.add_argument('--binary', action='store_true', help="バイナリフレーム (uint16) で送信")
+    parser.add_argument('--output-rate', type=int, default=0, help="ブリッジの output_rate_hz")
+    parser.add_argument('--bundle', action='store_true', help="OSCバンドル送信")
+    parser.add_argument('--settle', type=float, default=0.5, help="送信終了後に到着を待つ時間 (秒)")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="ベースラインのパス")
+    parser.add_argument('--save-baseline', action='store_true', help="結果をベースラインとして保存")
+    parser.add_argument('--compare', action='store_true', help="ベースラインと比較")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="劣化とみなす変化率")
+    parser.add_argument('--max-drop-increase', type=float, default=MIN_INCREASE['drop_rate'],
+                        help="劣化とみなす欠落率の増加量 (ベースラインが0の場合も適用)")
+    parser.add_argument('--loop', default=event_loop.EVENT_LOOP_AUTO, choices=event_loop.EVENT_LOOPS,
+                        help="ブリッジ・クライアントのイベントループ")
+    parser.add_argument('--compare-loops', action='store_true', help="asyncio と uvloop で同じ負荷を計測して比較")
+    parser.add_argument('--log-level', default="WARNING", help="ブリッジのログレベル")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.WARNING))
+
+    if args.compare_loops:
+        # 比較結果はベースラインの形式と異なるため、そのまま出力して終了
+        _, actual = event_loop.get_loop_factory(event_loop.EVENT_LOOP_UVLOOP)
+        names = [event_loop.EVENT_LOOP_ASYNCIO]
+        if actual == event_loop.EVENT_LOOP_UVLOOP:
+            names.append(event_loop.EVENT_LOOP_UVLOOP)
+        results = {name: run_once(args, name) for name in names}
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+
+    result = run_once(args, args.loop)
+
+    exit_code = 0
+    if args.compare:
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            mismatch = workload_mismatch(result, baseline)
+            if mismatch:
+                # 負荷条件が違う結果との比較は意味がないため比較しない
+                logging.error(f"負荷条件がベースラインと異なるため比較できません: {', '.join(mismatch)}")
+                result['workload_mismatch'] = mismatch
+                exit_code = 2
+            else:
+                min_increase = dict(MIN_INCREASE, drop_rate=args.max_drop_increase)
+                result['comparison'] = compare(result, baseline, args.tolerance, min_increase)
+                if any(entry['regression'] for entry in result['comparison'].values()):
+                    exit_code = 1
+        else:
+            logging.warning(f"ベースラインがありません: {args.baseline}")
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({key: value for key, value in result.items() if key not in ('comparison', 'workload_mismatch')},
+                      f, indent=2, ensure_ascii=False)
+            f.write("\n")
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
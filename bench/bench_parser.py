@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+受信メッセージ解析のマイクロベンチマーク
+旧方式 (parse_message で {tag: strength} を作り、タグごとにチャンネルを引く) と
+新方式 (parse_channels でチャンネル値を配列に直接書き込む) を比較する。
+同じチャンネル数のバイナリフレーム (parse_binary) の解析時間も計測する
+
+使い方:
+    python bench/bench_parser.py [--iterations 200000]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channel_state import CHANNEL_COUNT
+from config import Config
+from websocket_server import BINARY_FLOAT32, BINARY_UINT8, WebSocketServer, encode_binary_frame
+
+# 実際のクライアントが送るフレームに近い入力
+FRAMES = {
+    'single': "a:0.5",
+    'three_tags': "a:0.52;b:0.31;c:0.9",
+    'sixteen_tags': ";".join(f"t{channel}:0.{channel + 10}" for channel in range(CHANNEL_COUNT)),
+    'spaced': " a : 0.5 ; b : 0.25 ; c : 1.0 ",
+    'with_unknown': "a:0.5;unknown:0.2;b:0.1",
+}
+
+
+# テキストフレームと同じ内容のバイナリフレーム
+BINARY_FRAMES = {
+    'three_channels_uint8': encode_binary_frame({0: 0.52, 1: 0.31, 3: 0.9}, BINARY_UINT8),
+    'sixteen_channels_uint8': encode_binary_frame(
+        {channel: (channel + 10) / 100 for channel in range(CHANNEL_COUNT)}, BINARY_UINT8),
+    'sixteen_channels_float32': encode_binary_frame(
+        {channel: (channel + 10) / 100 for channel in range(CHANNEL_COUNT)}, BINARY_FLOAT32),
+}
+
+
+def create_config(directory: str) -> Config:
+    """ベンチマーク用の設定 (a/b/c と t0-t15)"""
+    path = os.path.join(directory, "config.json")
+    tag_map = {"a": 0, "b": 1, "c": 3}
+    tag_map.update({f"t{channel}": channel for channel in range(CHANNEL_COUNT)})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'tag_channel_map': tag_map}, f)
+    return Config(path)
+
+
+def bench_old(server: WebSocketServer, config: Config, frame: str, iterations: int) -> float:
+    """旧方式: 辞書を経由してタグごとにチャンネルを引く"""
+    get_channel = config.get_channel_for_tag
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        channel_values = {}
+        for tag, strength in server.parse_message(frame).items():
+            channel = get_channel(tag)
+            if channel is not None:
+                channel_values[channel] = strength
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def bench_new(server: WebSocketServer, frame: str, iterations: int) -> float:
+    """新方式: チャンネル値を配列に直接書き込む"""
+    values = array('f', bytes(4 * CHANNEL_COUNT))
+    parse_channels = server.parse_channels
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        parse_channels(frame, values)
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def bench_binary(server: WebSocketServer, frame: bytes, iterations: int) -> float:
+    """バイナリフレームの解析"""
+    values = array('f', bytes(4 * CHANNEL_COUNT))
+    parse_binary = server.parse_binary
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        parse_binary(frame, values)
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="受信メッセージ解析のマイクロベンチマーク")
+    parser.add_argument('--iterations', type=int, default=200000, help="フレームごとの繰り返し回数")
+    args = parser.parse_args()
+
+    # 不正な入力の警告ログでベンチマークが乱れないようにする
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        config = create_config(directory)
+        server = WebSocketServer()
+        server.set_channel_handler(config, None)
+
+        results = {}
+        for name, frame in FRAMES.items():
+            old_ns = bench_old(server, config, frame, args.iterations)
+            new_ns = bench_new(server, frame, args.iterations)
+            results[name] = {
+                'frame': frame,
+                'old_ns_per_frame': round(old_ns, 1),
+                'new_ns_per_frame': round(new_ns, 1),
+                'speedup': round(old_ns / new_ns, 2),
+            }
+        for name, frame in BINARY_FRAMES.items():
+            results[name] = {
+                'frame_bytes': len(frame),
+                'binary_ns_per_frame': round(bench_binary(server, frame, args.iterations), 1),
+            }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
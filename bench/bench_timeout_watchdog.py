@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+タイムアウト監視のマイクロベンチマーク
+メッセージごとにタスクを作り直す旧方式と、期限を延長するだけの
+ウォッチドッグ方式 (WebSocketOSCBridge._extend_channel_deadline) を比較する
+
+使い方:
+    python bench/bench_timeout_watchdog.py [--messages 100000]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+
+async def bench_task_churn(messages: int, timeout_seconds: float) -> dict:
+    """旧方式: メッセージごとにタスクをキャンセルして作り直す"""
+    loop = asyncio.get_running_loop()
+    task = None
+    tasks_created = 0
+
+    async def check_timeout():
+        await asyncio.sleep(timeout_seconds)
+
+    start = time.perf_counter_ns()
+    for _ in range(messages):
+        if task and not task.done():
+            task.cancel()
+        task = loop.create_task(check_timeout())
+        tasks_created += 1
+        # 実際のメッセージと同様に1メッセージごとにループを1周させる
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter_ns() - start
+    task.cancel()
+    return {'ns_per_message': elapsed / messages, 'tasks_created': tasks_created, 'timers_armed': tasks_created}
+
+
+async def bench_deadline_watchdog(messages: int, timeout_seconds: float) -> dict:
+    """新方式: 期限の更新のみ。タイマーはウォッチドッグが1つだけ保持"""
+    loop = asyncio.get_running_loop()
+    state = {'deadline': 0.0, 'handle': None, 'timers_armed': 0}
+
+    def watchdog():
+        if loop.time() < state['deadline']:
+            state['handle'] = loop.call_at(state['deadline'], watchdog)
+            state['timers_armed'] += 1
+            return
+        state['handle'] = None
+
+    start = time.perf_counter_ns()
+    for _ in range(messages):
+        state['deadline'] = loop.time() + timeout_seconds
+        if state['handle'] is None:
+            state['handle'] = loop.call_at(state['deadline'], watchdog)
+            state['timers_armed'] += 1
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter_ns() - start
+    state['handle'].cancel()
+    return {'ns_per_message': elapsed / messages, 'tasks_created': 0, 'timers_armed': state['timers_armed']}
+
+
+async def bench_loop_baseline(messages: int) -> float:
+    """ループを1周させるだけのコスト (差し引き用)"""
+    start = time.perf_counter_ns()
+    for _ in range(messages):
+        await asyncio.sleep(0)
+    return (time.perf_counter_ns() - start) / messages
+
+
+async def run(messages: int, timeout_seconds: float) -> dict:
+    baseline = await bench_loop_baseline(messages)
+    churn = await bench_task_churn(messages, timeout_seconds)
+    watchdog = await bench_deadline_watchdog(messages, timeout_seconds)
+    for result in (churn, watchdog):
+        result['ns_per_message_net'] = result['ns_per_message'] - baseline
+    return {
+        'messages': messages,
+        'loop_baseline_ns': baseline,
+        'task_churn': churn,
+        'deadline_watchdog': watchdog,
+        'speedup_net': churn['ns_per_message_net'] / max(watchdog['ns_per_message_net'], 1.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="タイムアウト監視のマイクロベンチマーク")
+    parser.add_argument('--messages', type=int, default=100000, help="メッセージ数")
+    parser.add_argument('--timeout', type=float, default=20.0, help="タイムアウト秒数")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.messages, args.timeout)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,53 +6,288 @@ WebSocketで受信したメッセージをOSCで送信する
 
 import asyncio
 import logging
-from typing import Dict
+import math
+import time
+from array import array
+from typing import Dict, Optional
+from channel_merger import ChannelMerger, build_policies
+from channel_state import CHANNEL_COUNT, ChannelState, iter_channels
 from config import Config
-from osc_client import OSCClient
+from event_loop import loop_name
+from latency import LatencyTracker
+from metrics import LAG_BUCKETS, Metrics
+from osc_client import AsyncOSCClient, OSCClient
+from traffic_log import CaptureWriter
 from websocket_server import WebSocketServer
 
+# 出力ティックが即時送信モード (0Hz) の場合に減衰ランプを進めるレート
+DECAY_TICK_HZ = 60
+# イベントループ遅延の計測間隔 (秒)
+LOOP_LAG_INTERVAL = 0.25
+# 減衰中の値がこれを下回ったら0にして減衰を終了
+DECAY_FLOOR = 0.005
+
+DECAY_NONE = "none"
+DECAY_LINEAR = "linear"
+DECAY_EXPONENTIAL = "exponential"
+
+
+def decay_value(mode: str, start_value: float, elapsed: float, decay_seconds: float) -> float:
+    """
+    減衰ランプの値を計算
+    
+    Args:
+        mode: "linear" (decay_seconds で0まで直線的に減少) または
+              "exponential" (時定数 decay_seconds で指数減衰)
+        start_value: 減衰開始時の値
+        elapsed: 減衰開始からの経過秒数
+        decay_seconds: 減衰時間
+    """
+    if decay_seconds <= 0:
+        return 0.0
+    if mode == DECAY_LINEAR:
+        return start_value * max(0.0, 1.0 - elapsed / decay_seconds)
+    return start_value * math.exp(-elapsed / decay_seconds)
+
+
+class SendFilter:
+    """
+    チャンネルごとのデッドバンド・重複送信抑制フィルター
+    
+    前回送信値との差が epsilon 以下の値は送信しない。
+    ただし keepalive_seconds 以上送信していないチャンネルは、同じ値でも
+    定期的に再送して受信側の状態をリフレッシュする。
+    """
+    
+    def __init__(self, epsilon: float = 0.0, keepalive_seconds: float = 1.0):
+        self.epsilon = epsilon
+        self.keepalive_seconds = keepalive_seconds
+        self.last_sent = array('f', bytes(4 * CHANNEL_COUNT))
+        self.last_sent_time = array('d', bytes(8 * CHANNEL_COUNT))
+        self.sent_mask = 0  # 一度でも送信したチャンネル
+        self.suppressed_count = 0
+        self.keepalive_count = 0
+    
+    def filter(self, mask: int, values, now: float) -> int:
+        """
+        送信すべきチャンネルのビットマスクを返す
+        
+        Args:
+            mask: 送信候補のチャンネルのビットマスク
+            values: チャンネル番号で値を引ける配列
+            now: 現在時刻 (time.monotonic())
+        """
+        result = mask
+        for channel in iter_channels(mask & self.sent_mask):
+            value = values[channel]
+            last = self.last_sent[channel]
+            # 0.0 / 1.0 への変化はデッドバンド内でも必ず送信 (停止・最大を確実に伝える)
+            if abs(value - last) <= self.epsilon and (
+                    value == last or (value != 0.0 and value != 1.0)):
+                if self.keepalive_seconds <= 0 or now - self.last_sent_time[channel] < self.keepalive_seconds:
+                    self.suppressed_count += 1
+                    result &= ~(1 << channel)
+                    continue
+                self.keepalive_count += 1
+        self.mark_sent(result, values, now)
+        return result
+    
+    def mark_sent(self, mask: int, values, now: float) -> None:
+        """送信した値を記録"""
+        for channel in iter_channels(mask):
+            self.last_sent[channel] = values[channel]
+            self.last_sent_time[channel] = now
+        self.sent_mask |= mask
+    
+    def reset(self) -> None:
+        """送信履歴をクリア (送信先変更時など)"""
+        self.sent_mask = 0
+
+
 class WebSocketOSCBridge:
     """WebSocket to OSC ブリッジクラス"""
     
     def __init__(self, config_file: str = "config.json"):
         self.config = Config(config_file)
-        self.osc_client = OSCClient(self.config.osc_ip, self.config.osc_port)
+        self.osc_client = self._create_osc_client()
         self.websocket_server = WebSocketServer(self.config.websocket_port, self.handle_websocket_message)
+        # 受信メッセージはタグ→チャンネルに直接解決して handle_channel_values へ渡す
+        self.websocket_server.set_channel_handler(self.config, self.handle_channel_values)
+        # バースト時に滞留したフレームは最新値にまとめて処理
+        self.websocket_server.coalesce_frames = self.config.coalesce_frames
+        self.websocket_server.set_client_handlers(self._on_client_connect, self._on_client_disconnect)
+        # 接続数の上限とクライアントごとのレート制限
+        self.websocket_server.configure_limits(
+            self.config.max_clients,
+            self.config.client_max_fps,
+            self.config.client_max_bytes_per_sec,
+            self.config.rate_limit_action
+        )
         self.is_running = False
         self.last_message_time = 0
         self.timeout_seconds = self.config.timeout_seconds
-        self.timeout_task = None
+        self.timeout_handle: Optional[asyncio.TimerHandle] = None
+        # タイムアウト後の減衰ランプ
+        self.decay_mode = self.config.decay_mode
+        self.decay_seconds = self.config.decay_seconds
         self.loop = None
-        self.last_values = {}  # 最後に送信した値を保持
+        # チャンネル値・変更フラグ・タイムアウト期限・減衰状態
+        self.channel_state = ChannelState()
+        # クライアントごとのチャンネル値と合成ポリシー
+        self.channel_merger = ChannelMerger(
+            build_policies(self.config.merge_policy, self.config.channel_merge_policies),
+            self.timeout_seconds)
+        # 出力ティック (Hz)。0 の場合は受信ごとに即時送信
+        self.output_rate_hz = self.config.output_rate_hz
+        self.output_task = None
+        # 重複・微小変化の送信抑制
+        self.send_filter = SendFilter(self.config.deadband_epsilon, self.config.keepalive_seconds)
+        # メトリクス (WebSocketポートの /metrics で出力)
+        self.metrics = Metrics()
+        self.osc_sends = self.metrics.counter("osc_sends_total", "OSC送信の回数")
+        self.osc_send_errors = self.metrics.counter("osc_send_errors_total", "OSC送信に失敗した回数")
+        self.loop_lag = self.metrics.histogram("event_loop_lag_seconds", "イベントループの遅延", LAG_BUCKETS)
+        self.lag_task = None
+        self._register_metrics()
+        # 受信から送信までの段階ごとの遅延
+        self.latency = LatencyTracker(self.config.latency_window, self.config.latency_trace_sample)
+        self.websocket_server.latency = self.latency
+        # 受信トラフィックの記録 (capture_file 設定時のみ)
+        self.capture: Optional[CaptureWriter] = None
     
-    async def _reset_timeout(self) -> None:
-        """タイムアウトをリセット"""
-        if self.timeout_task:
-            self.timeout_task.cancel()
-        self.timeout_task = asyncio.create_task(self._check_timeout())
+    def _register_metrics(self) -> None:
+        """ブリッジとWebSocketサーバーのメトリクスを登録"""
+        metrics = self.metrics
+        metrics.counter_func("suppressed_sends_total", "重複・微小変化で抑制した送信数",
+                             lambda: self.send_filter.suppressed_count)
+        metrics.counter_func("keepalive_sends_total", "同じ値の再送数", lambda: self.send_filter.keepalive_count)
+        metrics.counter_func("osc_dropped_total", "非同期送信キューで破棄したパケット数",
+                             lambda: self.osc_client.get_dropped_count() if isinstance(self.osc_client, AsyncOSCClient) else 0)
+        metrics.gauge_func("active_channels", "出力中のチャンネル数", lambda: bin(self.channel_state.active).count("1"))
+        self.websocket_server.set_metrics(metrics)
     
-    async def _check_timeout(self) -> None:
-        """タイムアウトチェック"""
-        try:
-            await asyncio.sleep(self.timeout_seconds)
-            # タイムアウト発生時に0を送信
-            if self.last_values:
-                logging.info(f"{self.timeout_seconds}秒間の入力がなかったため、0を送信します")
-                zero_values = {channel: 0.0 for channel in self.last_values}
-                if self.osc_client.is_connected():
-                    # 現在の値を0に更新してから送信
-                    for channel in self.last_values:
-                        self.last_values[channel] = 0.0
-                    self.osc_client.send_multiple_values(zero_values)
-                    logging.debug(f"タイムアウト: 0を送信: {zero_values}")
-                self.last_values.clear()
-        except asyncio.CancelledError:
-            # タスクがキャンセルされた場合は何もしない
-            logging.debug("タイムアウトタスクがキャンセルされました")
-            raise
-        except Exception as e:
-            logging.error(f"タイムアウト処理中にエラーが発生しました: {e}")
-            raise
+    async def _monitor_loop_lag(self) -> None:
+        """イベントループの遅延 (sleep の予定時刻からの遅れ) を一定間隔で記録"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag.observe(max(0.0, loop.time() - expected))
+    
+    def _create_osc_client(self) -> OSCClient:
+        """設定に応じてOSCクライアントを生成"""
+        if self.config.osc_async:
+            return AsyncOSCClient(
+                self.config.osc_ip,
+                self.config.osc_port,
+                self.config.osc_bundle,
+                queue_size=self.config.osc_send_queue_size,
+                drop_policy=self.config.osc_drop_policy
+            )
+        return OSCClient(self.config.osc_ip, self.config.osc_port, self.config.osc_bundle)
+    
+    def _extend_channel_deadline(self, channel: int) -> None:
+        """
+        チャンネルのタイムアウト期限を延長
+        
+        メッセージごとの処理は期限の更新 (float の代入) のみ。
+        ウォッチドッグが停止中の場合と、タイムアウトを短くして登録済みのタイマーより
+        期限が早くなった場合だけタイマーを登録し直す。
+        """
+        if not self.is_running or self.loop is None:
+            return
+        deadline = self.loop.time() + self.timeout_seconds
+        self.channel_state.deadlines[channel] = deadline
+        self.channel_state.decaying &= ~(1 << channel)
+        handle = self.timeout_handle
+        if handle is None or deadline < handle.when():
+            if handle is not None:
+                handle.cancel()
+            self.timeout_handle = self.loop.call_at(deadline, self._on_timeout_watchdog)
+    
+    def _clear_channel_deadline(self, channel: int) -> None:
+        """チャンネルのタイムアウト期限を解除 (0を受信した場合)"""
+        self.channel_state.deadlines[channel] = math.inf
+        self.channel_state.decaying &= ~(1 << channel)
+    
+    def _on_timeout_watchdog(self) -> None:
+        """
+        タイムアウトウォッチドッグ
+        
+        16チャンネルの期限を走査して期限切れのチャンネルを処理し、
+        残りの最も早い期限で再登録する。
+        """
+        self.timeout_handle = None
+        now = self.loop.time()
+        deadlines = self.channel_state.deadlines
+        expired = 0
+        next_deadline = math.inf
+        for channel in range(CHANNEL_COUNT):
+            deadline = deadlines[channel]
+            if deadline <= now:
+                expired |= 1 << channel
+                deadlines[channel] = math.inf
+            elif deadline < next_deadline:
+                next_deadline = deadline
+        if expired:
+            try:
+                self._on_timeout(expired, now)
+            except Exception as e:
+                logging.error(f"タイムアウト処理中にエラーが発生しました: {e}")
+        if next_deadline != math.inf:
+            self.timeout_handle = self.loop.call_at(next_deadline, self._on_timeout_watchdog)
+    
+    def _on_timeout(self, expired: int, now: float) -> None:
+        """
+        タイムアウトしたチャンネルを停止
+        
+        減衰ランプが無効の場合は即座に0を送信し、有効の場合は出力ティックで減衰させる
+        """
+        state = self.channel_state
+        # 期限切れのチャンネルは全クライアントの値を破棄 (切断済みでない古い値を復活させない)
+        self.channel_merger.clear(expired)
+        mask = 0
+        for channel in iter_channels(expired & state.active):
+            if state.values[channel]:
+                mask |= 1 << channel
+        if not mask:
+            return
+        logging.info(f"{self.timeout_seconds}秒間の入力がなかったチャンネルを停止します: {list(iter_channels(mask))}")
+        
+        if self.decay_mode != DECAY_NONE:
+            for channel in iter_channels(mask):
+                state.decay_start_value[channel] = state.values[channel]
+                state.decay_start_time[channel] = now
+            state.decaying |= mask
+            self._start_output_tick()
+            return
+        
+        state.zero(mask)
+        if self.osc_client.is_connected():
+            # 0送信は抑制フィルターを通さず必ず送る
+            self._send_mask(mask, force=True)
+            logging.debug(f"タイムアウト: 0を送信: {list(iter_channels(mask))}")
+    
+    def _step_decay(self, now: float) -> None:
+        """減衰中のチャンネルを1ティック分進めて変更フラグを立てる"""
+        state = self.channel_state
+        for channel in iter_channels(state.decaying):
+            value = decay_value(self.decay_mode, state.decay_start_value[channel],
+                                now - state.decay_start_time[channel], self.decay_seconds)
+            bit = 1 << channel
+            if value <= DECAY_FLOOR:
+                value = 0.0
+                state.decaying &= ~bit
+                state.active &= ~bit
+            state.values[channel] = value
+            state.dirty |= bit
+            state.version += 1
+    
+    def _cancel_timeout_watchdog(self) -> None:
+        """タイムアウトウォッチドッグを停止"""
+        if self.timeout_handle is not None:
+            self.timeout_handle.cancel()
+            self.timeout_handle = None
     
     async def handle_websocket_message(self, data: Dict[str, float]) -> None:
         """
@@ -61,43 +296,186 @@ class WebSocketOSCBridge:
         Args:
             data: {tag: strength} の辞書
         """
-        logging.debug(f"WebSocketメッセージ受信: {data}")
-        
-        # タグをチャンネルにマッピングしてOSC送信
-        channel_values = {}
-        has_non_zero = False
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug(f"WebSocketメッセージ受信: {data}")
         
+        # タグをチャンネルにマッピング
+        values = array('f', bytes(4 * CHANNEL_COUNT))
+        mask = 0
         for tag, strength in data.items():
             channel = self.config.get_channel_for_tag(tag)
-            if channel is not None:
-                channel_values[channel] = strength
-                self.last_values[channel] = strength  # 最後の値を記録
-                if strength > 0:
-                    has_non_zero = True
-                logging.debug(f"マッピング: {tag} -> チャンネル {channel} = {strength}")
-            else:
+            if channel is None:
                 logging.warning(f"未設定のタグ: {tag}")
+                continue
+            if not (0 <= channel < CHANNEL_COUNT):
+                logging.error(f"無効なチャンネル番号: {channel}")
+                continue
+            values[channel] = strength
+            mask |= 1 << channel
+        
+        if mask:
+            await self.handle_channel_values(mask, values)
+    
+    async def handle_channel_values(self, mask: int, values, client=None) -> None:
+        """
+        チャンネル値を処理してOSCで送信
         
-        # 0以外の値があればタイマーをリセット
-        if has_non_zero:
-            if self.timeout_task and not self.timeout_task.done():
-                self.timeout_task.cancel()
-            self.timeout_task = asyncio.create_task(self._check_timeout())
-        
-        # OSCで送信
-        if channel_values and self.osc_client.is_connected():
-            success = self.osc_client.send_multiple_values(channel_values)
-            if success:
-                logging.debug(f"OSC送信成功: {channel_values}")
+        Args:
+            mask: 更新するチャンネルのビットマスク
+            values: チャンネル番号で値を引ける配列
+            client: 送信元の接続 (他のクライアントの値とチャンネルごとの合成ポリシーで合成)
+        """
+        mask = self.channel_merger.update(client, mask, values)
+        values = self.channel_merger.merged
+        state = self.channel_state
+        now = time.monotonic()
+        
+        for channel in iter_channels(mask):
+            strength = values[channel]
+            state.set(channel, strength, now)
+            # 0以外の値ならチャンネルのタイムアウト期限を延長
+            if strength > 0:
+                self._extend_channel_deadline(channel)
             else:
-                logging.error("OSC送信失敗")
-        elif not self.osc_client.is_connected():
+                self._clear_channel_deadline(channel)
+        
+        self.latency.mark_mapped(mask, time.perf_counter_ns())
+        
+        # 出力ティック動作中は変更フラグだけを残し、次のティックでまとめて送信
+        if state.dirty and not self._is_output_tick_active():
+            self._flush()
+    
+    def _on_client_connect(self, websocket) -> None:
+        """クライアント接続時に接続URLで指定された優先度で登録"""
+        self.channel_merger.add_client(websocket, self.websocket_server.get_client_priority(websocket))
+    
+    def _on_client_disconnect(self, websocket) -> None:
+        """
+        クライアント切断時にそのクライアントの値を取り除いて合成し直す
+        
+        他のクライアントが値を保持しているチャンネルだけを更新する。
+        切断したクライアントだけが使っていたチャンネルはタイムアウトで停止する。
+        """
+        mask = self.channel_merger.remove_client(websocket)
+        if not mask:
+            return
+        state = self.channel_state
+        merged = self.channel_merger.merged
+        now = time.monotonic()
+        for channel in iter_channels(mask):
+            state.set(channel, merged[channel], now)
+        if not self._is_output_tick_active():
+            self._flush()
+    
+    def _flush(self) -> None:
+        """変更のあったチャンネルの最新値を送信"""
+        mask = self.channel_state.take_dirty()
+        if mask:
+            self._send_mask(mask)
+    
+    def _send_mask(self, mask: int, force: bool = False) -> None:
+        """
+        チャンネル値をOSCで送信
+        
+        Args:
+            mask: 送信するチャンネルのビットマスク
+            force: True の場合は抑制フィルターを通さずに送信
+        """
+        scheduled = time.perf_counter_ns()
+        if not self.osc_client.is_connected():
             logging.warning("OSCクライアントが接続されていません")
+            self.latency.discard(mask)
+            return
+        values = self.channel_state.values
+        if force:
+            self.send_filter.mark_sent(mask, values, time.monotonic())
+        else:
+            requested = mask
+            mask = self.send_filter.filter(mask, values, time.monotonic())
+            if mask != requested:
+                self.latency.discard(requested & ~mask)
+            if not mask:
+                return
+        success = self.osc_client.send_masked_values(mask, values)
+        self.latency.mark_sent(mask, scheduled, time.perf_counter_ns())
+        self.osc_sends.inc()
+        if success:
+            if logging.root.isEnabledFor(logging.DEBUG):
+                logging.debug(f"OSC送信成功: {list(iter_channels(mask))}")
+        else:
+            self.osc_send_errors.inc()
+            logging.error("OSC送信失敗")
+    
+    def _is_output_tick_active(self) -> bool:
+        """出力ティックが動作中か"""
+        return self.output_rate_hz > 0 and self.output_task is not None and not self.output_task.done()
+    
+    async def _output_tick(self) -> None:
+        """
+        固定レートの出力ティック
+        
+        ティックごとに、前回から変化したチャンネルの最新値だけを送信する。
+        受信レートに関係なくOSC送信レートは output_rate_hz 以下に抑えられる。
+        """
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        try:
+            # 即時送信モードでも減衰中のチャンネルがある間は DECAY_TICK_HZ で動作
+            while self.output_rate_hz > 0 or self.channel_state.decaying:
+                next_tick += 1.0 / (self.output_rate_hz or DECAY_TICK_HZ)
+                now = loop.time()
+                if next_tick < now:
+                    # 処理が遅れた場合は遅れを取り戻そうとせず次の周期から再開
+                    next_tick = now
+                await asyncio.sleep(next_tick - now)
+                if self.channel_state.decaying:
+                    self._step_decay(loop.time())
+                if self.channel_state.dirty:
+                    self._flush()
+        finally:
+            # 即時送信モードへ切り替えた場合も未送信の値を残さない
+            if self.channel_state.dirty:
+                self._flush()
+    
+    def _start_output_tick(self) -> None:
+        """出力ティックタスクを開始 (ブリッジのループスレッドで実行)"""
+        if self.output_task is not None and not self.output_task.done():
+            return
+        if self.output_rate_hz > 0 or self.channel_state.decaying:
+            self.output_task = asyncio.get_running_loop().create_task(self._output_tick())
+            if self.output_rate_hz > 0:
+                logging.info(f"出力ティックを開始しました: {self.output_rate_hz}Hz")
+    
+    def set_output_rate(self, rate_hz: int) -> None:
+        """
+        出力ティックレートを更新
+        
+        Args:
+            rate_hz: 送信レート (Hz)。0 で受信ごとの即時送信
+        """
+        self.config.set_output_rate_hz(rate_hz)
+        self.output_rate_hz = self.config.output_rate_hz
+        # ティックは output_rate_hz を毎周期参照するため、停止中→開始の場合のみ起動が必要
+        if self.is_running and self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._start_output_tick)
+    
+    def set_timeout_seconds(self, seconds: int) -> None:
+        """タイムアウト秒数を更新 (次に受信した値の期限から適用)"""
+        self.config.set_timeout_seconds(seconds)
+        self.timeout_seconds = seconds
+        self.channel_merger.timeout_seconds = seconds
     
     def update_osc_target(self, ip: str, port: int = 8000) -> bool:
         """OSC送信先を更新"""
         self.config.set_osc_target(ip, port)
+        # 新しい送信先は前回値を受け取っていないため抑制履歴をリセット
+        self.send_filter.reset()
         return self.osc_client.update_target(ip, port)
+    
+    def set_osc_bundle(self, enabled: bool) -> None:
+        """OSCバンドル送信の有効/無効を切り替え"""
+        self.config.set_osc_bundle(enabled)
+        self.osc_client.set_bundle_mode(enabled)
 
     def set_websocket_port(self, port: int) -> bool:
         """WebSocket ポートを更新
@@ -141,8 +519,28 @@ class WebSocketOSCBridge:
             'websocket_clients': self.websocket_server.get_client_count(),
             'osc_connected': self.osc_client.is_connected(),
             'osc_target': self.config.get_osc_target(),
+            'osc_bundle': self.osc_client.use_bundle,
+            'osc_async': isinstance(self.osc_client, AsyncOSCClient),
+            'osc_dropped': self.osc_client.get_dropped_count() if isinstance(self.osc_client, AsyncOSCClient) else 0,
             'tag_mappings': self.config.tag_channel_map.copy(),
             'timeout_seconds': self.timeout_seconds,
+            'output_rate_hz': self.output_rate_hz,
+            'suppressed_sends': self.send_filter.suppressed_count,
+            'keepalive_sends': self.send_filter.keepalive_count,
+            'decay_mode': self.decay_mode,
+            'decaying_channels': list(iter_channels(self.channel_state.decaying)),
+            'active_channels': self.channel_state.active_channels(),
+            'channel_values': list(self.channel_state.values),
+            'merge_policies': list(self.channel_merger.policies),
+            'osc_sends': self.osc_sends.value,
+            'osc_send_errors': self.osc_send_errors.value,
+            'loop_lag_max_ms': round(self.loop_lag.max * 1000, 2),
+            'latency': self.latency.summary(),
+            'event_loop': loop_name(self.loop) if self.loop else None,
+            'capture_file': self.capture.path if self.capture else None,
+            'capture_records': self.capture.records if self.capture else 0,
+            'capture_dropped': self.capture.dropped if self.capture else 0,
+            **self.websocket_server.get_input_stats(),
             'websocket_port': self.config.websocket_port
         }
     
@@ -160,79 +558,99 @@ class WebSocketOSCBridge:
             else:
                 logging.warning("OSCクライアントの接続に失敗しました")
         
-        # 既存のタイムアウトタスクをクリア
-        if self.timeout_task and not self.timeout_task.done():
-            self.timeout_task.cancel()
+        # 非同期OSCクライアントはこのループのデータグラムトランスポートに接続
+        if isinstance(self.osc_client, AsyncOSCClient):
+            await self.osc_client.start()
+        
+        # 既存のタイムアウトウォッチドッグをクリア
+        self._cancel_timeout_watchdog()
+        
+        # 受信トラフィックの記録開始
+        self._start_capture()
+        
+        # 出力ティック開始
+        self._start_output_tick()
+        
+        # イベントループ遅延の計測開始
+        if self.lag_task is None or self.lag_task.done():
+            self.lag_task = asyncio.get_running_loop().create_task(self._monitor_loop_lag())
         
         # WebSocketサーバー開始
         try:
-            await self.websocket_server.start_server()
-            # 初期タイムアウトタスクを開始
-            self.timeout_task = asyncio.create_task(self._check_timeout())
             logging.info("タイムアウト監視を開始しました")
+            await self.websocket_server.start_server()
         except Exception as e:
             logging.error(f"WebSocketサーバーエラー: {e}")
             self.is_running = False
             raise
     
+    def _start_capture(self) -> None:
+        """capture_file が設定されていれば受信トラフィックの記録を開始 (パスは strftime 形式)"""
+        if not self.config.capture_file or self.capture is not None:
+            return
+        try:
+            capture = CaptureWriter(time.strftime(self.config.capture_file))
+            capture.start()
+        except Exception as e:
+            logging.error(f"受信トラフィックの記録を開始できませんでした: {e}")
+            return
+        self.capture = capture
+        self.websocket_server.capture = capture
+    
+    def _stop_capture(self) -> None:
+        """受信トラフィックの記録を終了 (残りの書き込みを待つ)"""
+        if self.capture is None:
+            return
+        self.websocket_server.capture = None
+        self.capture.close()
+        self.capture = None
+    
     async def stop(self) -> None:
         """ブリッジを停止"""
         logging.info("WebSocket to OSC ブリッジを停止します...")
         try:
-            # タイムアウトタスクをキャンセル
-            if self.timeout_task:
-                self.timeout_task.cancel()
+            # タイムアウトウォッチドッグを停止
+            self._cancel_timeout_watchdog()
+            
+            # 出力ティックを停止 (停止時は0を送信するため未送信の値・減衰は破棄)
+            self.channel_state.dirty = 0
+            self.channel_state.decaying = 0
+            if self.output_task:
+                self.output_task.cancel()
                 try:
-                    await self.timeout_task
+                    await self.output_task
                 except asyncio.CancelledError:
                     pass
-                self.timeout_task = None
+                self.output_task = None
+            if self.lag_task:
+                self.lag_task.cancel()
+                self.lag_task = None
                 
-            # WebSocketサーバーを停止
+            # WebSocketサーバーを停止 (切断による再合成は不要なので先に破棄)
+            self.channel_merger.reset()
             if hasattr(self, 'websocket_server') and self.websocket_server:
                 await self.websocket_server.stop_server()
                 
             # 最後に0を送信
-            if self.last_values and self.osc_client.is_connected():
-                zero_values = {channel: 0.0 for channel in self.last_values}
-                self.osc_client.send_multiple_values(zero_values)
-                logging.debug(f"停止時に0を送信: {zero_values}")
+            active = self.channel_state.active
+            if active and self.osc_client.is_connected():
+                self.channel_state.zero(active)
+                self._send_mask(active, force=True)
+                logging.debug(f"停止時に0を送信: {list(iter_channels(active))}")
                 
         except Exception as e:
             logging.error(f"ブリッジ停止中にエラーが発生しました: {e}")
         finally:
+            self._stop_capture()
             self.osc_client.disconnect()
             self.is_running = False
-            self.last_values.clear()
+            self.channel_state.reset()
+            self.channel_merger.reset()
+            self.send_filter.reset()
+            self.latency.reset()
 
 if __name__ == "__main__":
-    # テスト用コード
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
-    
-    print("=== WebSocket to OSC ブリッジテスト ===")
-    print("ブリッジを開始します...")
-    print("WebSocket: ws://localhost:3031/haptic")
-    print("OSC送信先: 127.0.0.1:8000")
-    print("Ctrl+C で停止")
-    
-    # ブリッジ作成
-    bridge = WebSocketOSCBridge()
-    
-    # 状態表示
-    status = bridge.get_status()
-    print(f"設定状況:")
-    print(f"  OSC送信先: {status['osc_target']}")
-    print(f"  タグマッピング: {status['tag_mappings']}")
-    
-    try:
-        # ブリッジ開始
-        asyncio.run(bridge.start())
-    except KeyboardInterrupt:
-        print("\nブリッジを停止します...")
-        asyncio.run(bridge.stop())
-    except Exception as e:
-        print(f"エラー: {e}")
-
+    # ヘッドレス起動 (cli.py と同じ。シグナルで正常に停止する)
+    import sys
+    from cli import main
+    sys.exit(main())
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+チャンネル合成モジュール
+複数のWebSocketクライアントのチャンネル値をクライアントごとに保持し、
+チャンネルごとの合成ポリシーで1つの出力値にまとめる
+"""
+
+import logging
+import math
+import time
+from array import array
+from typing import Dict, Hashable, List, Optional
+from channel_state import CHANNEL_COUNT, iter_channels
+
+MERGE_MAX = "max"            # 最大値
+MERGE_SUM = "sum"            # 合計 (1.0でクランプ)
+MERGE_LATEST = "latest"      # 最後に送ったクライアントの値
+MERGE_PRIORITY = "priority"  # 優先度が最も高いクライアントの値 (同じ優先度なら最後に送った方)
+MERGE_POLICIES = (MERGE_MAX, MERGE_SUM, MERGE_LATEST, MERGE_PRIORITY)
+
+
+def build_policies(default: str, overrides: Optional[Dict] = None) -> List[str]:
+    """
+    チャンネルごとの合成ポリシー一覧を作成
+
+    Args:
+        default: 全チャンネル共通のポリシー
+        overrides: {channel: policy} のチャンネル別指定 (JSON由来の文字列キーも可)
+    """
+    if default not in MERGE_POLICIES:
+        logging.warning(f"不明な合成ポリシー: {default} ({MERGE_LATEST} を使用します)")
+        default = MERGE_LATEST
+    policies = [default] * CHANNEL_COUNT
+    for channel, policy in (overrides or {}).items():
+        try:
+            channel = int(channel)
+        except (TypeError, ValueError):
+            logging.warning(f"合成ポリシーのチャンネル番号が不正です: {channel}")
+            continue
+        if not (0 <= channel < CHANNEL_COUNT) or policy not in MERGE_POLICIES:
+            logging.warning(f"合成ポリシーの指定が不正です: {channel}: {policy}")
+            continue
+        policies[channel] = policy
+    return policies
+
+
+class ClientChannels:
+    """クライアントごとのチャンネル値"""
+
+    __slots__ = ("priority", "values", "sequence", "updated", "active")
+
+    def __init__(self, priority: int = 0):
+        self.priority = priority
+        self.values = array('f', bytes(4 * CHANNEL_COUNT))
+        # チャンネルごとの最終更新の通し番号 (latest / priority の判定用)
+        self.sequence = array('q', bytes(8 * CHANNEL_COUNT))
+        # チャンネルごとの最終更新時刻 (time.monotonic)
+        self.updated = array('d', bytes(8 * CHANNEL_COUNT))
+        # 値を保持しているチャンネル
+        self.active = 0
+
+
+class ChannelMerger:
+    """
+    チャンネル合成クラス
+
+    クライアントの更新ごとに、そのクライアントが送ったチャンネルだけを再計算する。
+    チャンネルに値を保持しているクライアントが1つだけの場合は再計算せずにその値を使う。
+    timeout_seconds 秒以上更新のないクライアントの値は合成から外す。
+    """
+
+    def __init__(self, policies: Optional[List[str]] = None, timeout_seconds: float = math.inf):
+        self.policies = list(policies or [MERGE_LATEST] * CHANNEL_COUNT)
+        self.timeout_seconds = timeout_seconds
+        self.clients: Dict[Hashable, ClientChannels] = {}
+        # チャンネルごとの値を保持しているクライアント
+        self.holders: List[List[ClientChannels]] = [[] for _ in range(CHANNEL_COUNT)]
+        # 合成後の値 (channel_handler にそのまま渡せる配列)
+        self.merged = array('f', bytes(4 * CHANNEL_COUNT))
+        # sum ポリシー用の合計 (クランプ前)
+        self.sums = array('d', bytes(8 * CHANNEL_COUNT))
+        self._sequence = 0
+
+    def add_client(self, client: Hashable, priority: int = 0) -> ClientChannels:
+        """クライアントを登録 (未登録のクライアントは最初の更新時に優先度0で登録される)"""
+        entry = self.clients.get(client)
+        if entry is None:
+            entry = self.clients[client] = ClientChannels(priority)
+        else:
+            entry.priority = priority
+        return entry
+
+    def update(self, client: Hashable, mask: int, values) -> int:
+        """
+        クライアントのチャンネル値を更新して合成値を再計算
+
+        Args:
+            client: クライアントを識別するキー
+            mask: 更新するチャンネルのビットマスク
+            values: チャンネル番号で値を引ける配列
+        Returns:
+            再計算したチャンネルのビットマスク (mask と同じ)
+        """
+        entry = self.clients.get(client)
+        if entry is None:
+            entry = self.clients[client] = ClientChannels()
+        self._sequence += 1
+        sequence = self._sequence
+        now = time.monotonic()
+        cutoff = now - self.timeout_seconds
+        merged = self.merged
+        for channel in iter_channels(mask):
+            value = values[channel]
+            bit = 1 << channel
+            held = entry.active & bit
+            previous = entry.values[channel]
+            entry.values[channel] = value
+            entry.sequence[channel] = sequence
+            entry.updated[channel] = now
+            holders = self.holders[channel]
+            if not held:
+                entry.active |= bit
+                holders.append(entry)
+            if len(holders) > 1 and self._expire(channel, cutoff):
+                # 古い値を外した場合は残りのクライアントから再計算
+                self._recompute(channel)
+                continue
+            value = entry.values[channel]  # float32 に丸めた値で比較する
+
+            policy = self.policies[channel]
+            if policy == MERGE_SUM:
+                total = self.sums[channel] + value - (previous if held else 0.0)
+                self.sums[channel] = total
+                merged[channel] = max(0.0, min(1.0, total))
+            elif len(holders) == 1 or policy == MERGE_LATEST:
+                merged[channel] = value
+            elif policy == MERGE_MAX:
+                if value >= merged[channel]:
+                    merged[channel] = value
+                elif held and previous >= merged[channel]:
+                    # 最大値を持っていたクライアントが値を下げた場合のみ全体を再計算
+                    self._recompute(channel)
+            else:
+                self._recompute(channel)
+        return mask
+
+    def remove_client(self, client: Hashable) -> int:
+        """
+        クライアントを削除して、そのクライアントが値を保持していたチャンネルを再計算
+
+        Returns:
+            他のクライアントの値で merged を更新したチャンネルのビットマスク。
+            値を保持していたのがこのクライアントだけ (他は timeout_seconds 以上更新なし) の
+            チャンネルは、出力値をそのまま残す (タイムアウトで停止する)
+        """
+        entry = self.clients.pop(client, None)
+        if entry is None:
+            return 0
+        cutoff = time.monotonic() - self.timeout_seconds
+        updated = 0
+        for channel in iter_channels(entry.active):
+            holders = self.holders[channel]
+            holders.remove(entry)
+            self._expire(channel, cutoff)
+            if holders:
+                self._recompute(channel)
+                updated |= 1 << channel
+            else:
+                self.sums[channel] = 0.0
+        return updated
+
+    def clear(self, mask: int) -> None:
+        """指定チャンネルの全クライアントの値を破棄 (タイムアウト時)"""
+        for channel in iter_channels(mask):
+            bit = 1 << channel
+            for entry in self.holders[channel]:
+                entry.active &= ~bit
+            self.holders[channel].clear()
+            self.sums[channel] = 0.0
+            self.merged[channel] = 0.0
+
+    def reset(self) -> None:
+        """全クライアントの値を破棄"""
+        self.clients.clear()
+        for holders in self.holders:
+            holders.clear()
+        self.merged[:] = array('f', bytes(4 * CHANNEL_COUNT))
+        self.sums[:] = array('d', bytes(8 * CHANNEL_COUNT))
+
+    def _expire(self, channel: int, cutoff: float) -> bool:
+        """
+        最終更新が cutoff より前のクライアントの値をチャンネルから外す (外した場合は True)
+
+        接続に紐付かない値 (client=None のテスト送信) も同じく外す。
+        古い値がない場合はリストを作り直さない。
+        """
+        holders = self.holders[channel]
+        for entry in holders:
+            if entry.updated[channel] < cutoff:
+                break
+        else:
+            return False
+        bit = 1 << channel
+        fresh = []
+        for entry in holders:
+            if entry.updated[channel] < cutoff:
+                entry.active &= ~bit
+            else:
+                fresh.append(entry)
+        holders[:] = fresh
+        return True
+
+    def _recompute(self, channel: int) -> None:
+        """チャンネルの合成値を値を保持している全クライアントから再計算"""
+        holders = self.holders[channel]
+        if not holders:
+            return
+        policy = self.policies[channel]
+        if policy == MERGE_MAX:
+            value = max(entry.values[channel] for entry in holders)
+        elif policy == MERGE_SUM:
+            total = sum(entry.values[channel] for entry in holders)
+            self.sums[channel] = total
+            value = max(0.0, min(1.0, total))
+        elif policy == MERGE_LATEST:
+            value = max(holders, key=lambda entry: entry.sequence[channel]).values[channel]
+        else:
+            value = max(holders, key=lambda entry: (entry.priority, entry.sequence[channel])).values[channel]
+        self.merged[channel] = value
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+チャンネル状態モジュール
+16チャンネル分の出力値・変更フラグ・タイムスタンプを固定長配列とビットマスクで保持
+"""
+
+import math
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+CHANNEL_COUNT = 16
+ALL_CHANNELS_MASK = (1 << CHANNEL_COUNT) - 1
+
+_ZERO_VALUES = array('f', bytes(4 * CHANNEL_COUNT))
+_NO_DEADLINES = array('d', [math.inf] * CHANNEL_COUNT)
+
+
+def iter_channels(mask: int) -> Iterator[int]:
+    """ビットマスクに含まれるチャンネル番号を昇順に列挙"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class ChannelState:
+    """
+    チャンネル状態クラス
+
+    - values: 現在の出力値 (float32)
+    - active: 値を出力中のチャンネル (停止時・タイムアウト時に0を送る対象)
+    - dirty: 前回の送信以降に変化したチャンネル
+    - updated_at: 最終更新時刻 (time.monotonic())
+    - deadlines: タイムアウト期限 (loop.time() 基準, 期限なしは inf)
+    - decaying: 減衰中のチャンネルと、減衰開始時の値・時刻
+    - version: values・active が変わるたびに増える (他スレッドからの変更検知用)
+    """
+
+    __slots__ = (
+        "values", "active", "dirty", "updated_at", "deadlines",
+        "decaying", "decay_start_value", "decay_start_time", "version",
+    )
+
+    def __init__(self):
+        self.values = array('f', _ZERO_VALUES)
+        self.updated_at = array('d', bytes(8 * CHANNEL_COUNT))
+        self.deadlines = array('d', _NO_DEADLINES)
+        self.decay_start_value = array('f', _ZERO_VALUES)
+        self.decay_start_time = array('d', bytes(8 * CHANNEL_COUNT))
+        self.active = 0
+        self.dirty = 0
+        self.decaying = 0
+        self.version = 0
+
+    def set(self, channel: int, value: float, now: float) -> None:
+        """チャンネル値を更新して変更フラグを立てる"""
+        self.values[channel] = value
+        bit = 1 << channel
+        self.active |= bit
+        self.dirty |= bit
+        self.updated_at[channel] = now
+        self.version += 1
+
+    def take_dirty(self) -> int:
+        """変更フラグを取得してクリア"""
+        mask = self.dirty
+        self.dirty = 0
+        return mask
+
+    def zero(self, mask: int) -> None:
+        """指定チャンネルを0にして出力中・変更・減衰フラグを外す"""
+        for channel in iter_channels(mask):
+            self.values[channel] = 0.0
+        self.active &= ~mask
+        self.dirty &= ~mask
+        self.decaying &= ~mask
+        self.version += 1
+
+    def reset(self) -> None:
+        """全チャンネルを初期状態に戻す"""
+        self.values[:] = _ZERO_VALUES
+        self.deadlines[:] = _NO_DEADLINES
+        self.active = 0
+        self.dirty = 0
+        self.decaying = 0
+        self.version += 1
+
+    def snapshot(self) -> Tuple[float, ...]:
+        """全チャンネル値のスナップショット"""
+        return tuple(self.values)
+
+    def snapshot_if_changed(self, version: int) -> Optional[Tuple[int, int, Tuple[float, ...]]]:
+        """
+        version から変化していれば (version, active, 全チャンネル値) を返す
+
+        ロックを取らずに別スレッド (GUI) から呼び出せる。値のコピーは1回の呼び出しで行うため
+        チャンネルの途中の値が混ざることはなく、コピー中に更新された場合も version が
+        古いまま返るので次の呼び出しで最新の値を取得できる。
+        """
+        current = self.version
+        if current == version:
+            return None
+        return current, self.active, tuple(self.values)
+
+    def active_channels(self) -> List[int]:
+        """出力中のチャンネル番号一覧"""
+        return list(iter_channels(self.active))
+
+    def active_values(self) -> Dict[int, float]:
+        """出力中のチャンネル値 {channel: value}"""
+        return {channel: self.values[channel] for channel in iter_channels(self.active)}
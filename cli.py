@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+ヘッドレス起動用コマンド
+GUI (Flet) を読み込まずに WebSocketOSCBridge を起動し、SIGINT / SIGTERM で正常に停止する
+
+使い方:
+    python cli.py [--config config.json] [--port 3031] [--osc-ip 192.168.1.5] [--osc-port 8000]
+                  [--log-level INFO] [--log-file bridge.log]
+    python cli.py --measure-startup   # 起動時間を計測して終了
+"""
+
+import time
+
+_PROCESS_START = time.perf_counter()
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import signal
+import sys
+
+import event_loop
+import log_pipeline
+from bridge import WebSocketOSCBridge
+
+_IMPORTED = time.perf_counter()
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="WS Haptira Bridge (ヘッドレス)")
+    parser.add_argument('--config', default="config.json", help="設定ファイル")
+    parser.add_argument('--port', type=int, help="WebSocketポート (設定ファイルより優先)")
+    parser.add_argument('--osc-ip', help="OSC送信先IPアドレス (設定ファイルより優先)")
+    parser.add_argument('--osc-port', type=int, help="OSC送信先ポート (設定ファイルより優先)")
+    parser.add_argument('--log-level', default="INFO", help="ログレベル (DEBUG / INFO / WARNING / ERROR)")
+    parser.add_argument('--log-file', help="ログの出力先ファイル (指定しない場合は標準エラー)")
+    parser.add_argument('--loop', choices=event_loop.EVENT_LOOPS, help="イベントループ (設定ファイルより優先)")
+    parser.add_argument('--measure-startup', action='store_true', help="起動時間をJSONで出力して終了")
+    return parser.parse_args(argv)
+
+
+def setup_logging(level: str, log_file: str = None) -> log_pipeline.LogPipeline:
+    """ログ設定 (出力はバックグラウンドスレッドで行う)"""
+    handlers = [logging.FileHandler(log_file, encoding='utf-8')] if log_file else None
+    return log_pipeline.setup_logging(getattr(logging, level.upper(), logging.INFO), handlers)
+
+
+def create_bridge(args: argparse.Namespace) -> WebSocketOSCBridge:
+    """設定ファイルとコマンドライン引数からブリッジを作成"""
+    bridge = WebSocketOSCBridge(args.config)
+    if args.port:
+        bridge.config.websocket_port = args.port
+        bridge.websocket_server.port = args.port
+    if args.osc_ip or args.osc_port:
+        ip = args.osc_ip or bridge.config.osc_ip
+        port = args.osc_port or bridge.config.osc_port
+        bridge.config.osc_ip = ip
+        bridge.config.osc_port = port
+        bridge.osc_client.update_target(ip, port)
+    return bridge
+
+
+def install_signal_handlers(loop: asyncio.AbstractEventLoop, stop_event: asyncio.Event) -> None:
+    """
+    SIGINT / SIGTERM で停止を要求する
+
+    停止処理中にもう一度シグナルを受けた場合は強制終了する
+    """
+    def request_stop():
+        if stop_event.is_set():
+            logging.warning("停止処理中に再度シグナルを受信したため強制終了します")
+            os._exit(1)
+        logging.info("停止シグナルを受信しました")
+        stop_event.set()
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, request_stop)
+        except (NotImplementedError, RuntimeError):
+            # Windows のイベントループはシグナルハンドラーに対応していない
+            signal.signal(signum, lambda *_: loop.call_soon_threadsafe(request_stop))
+
+
+async def run(args: argparse.Namespace, bridge: WebSocketOSCBridge) -> int:
+    """ブリッジを起動し、停止要求またはサーバー終了まで待機"""
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    install_signal_handlers(loop, stop_event)
+
+    bridge_task = asyncio.create_task(bridge.start())
+
+    # 起動時間 (プロセス開始からWebSocketサーバーの待ち受け開始まで)
+    while not bridge.websocket_server.is_running and not bridge_task.done():
+        await asyncio.sleep(0.005)
+    ready = time.perf_counter()
+    startup = {
+        'import_ms': round((_IMPORTED - _PROCESS_START) * 1000, 1),
+        'startup_ms': round((ready - _PROCESS_START) * 1000, 1),
+        'flet_imported': 'flet' in sys.modules,
+        'event_loop': event_loop.loop_name(loop),
+    }
+    if bridge_task.done():
+        logging.error("ブリッジを起動できませんでした")
+        await bridge.stop()
+        return 1
+    logging.info(f"起動しました: ws://0.0.0.0:{bridge.config.websocket_port}/haptic → "
+                 f"OSC {bridge.config.osc_ip}:{bridge.config.osc_port}, {startup['event_loop']} "
+                 f"(起動時間 {startup['startup_ms']}ms, import {startup['import_ms']}ms)")
+
+    if args.measure_startup:
+        print(json.dumps(startup))
+        stop_event.set()
+
+    stop_wait = asyncio.create_task(stop_event.wait())
+    await asyncio.wait({stop_wait, bridge_task}, return_when=asyncio.FIRST_COMPLETED)
+    stop_wait.cancel()
+
+    await bridge.stop()
+    try:
+        await asyncio.wait_for(bridge_task, timeout=10)
+    except asyncio.TimeoutError:
+        logging.warning("WebSocketサーバーの終了待ちがタイムアウトしました")
+    logging.info("停止しました")
+    return 0
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    pipeline = setup_logging(args.log_level, args.log_file)
+    try:
+        # 設定読み込みのメッセージで --measure-startup のJSON出力が乱れないよう標準エラーへ
+        with contextlib.redirect_stdout(sys.stderr):
+            bridge = create_bridge(args)
+        return event_loop.run(run(args, bridge), args.loop or bridge.config.event_loop)
+    finally:
+        pipeline.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
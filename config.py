@@ -6,7 +6,10 @@
 
 import json
 import os
-from typing import Dict, Optional
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+
+from config_writer import ConfigWriter
 
 class Config:
     """設定管理クラス"""
@@ -14,10 +17,42 @@ class Config:
     def __init__(self, config_file: str = "config.json"):
         self.config_file = config_file
         self.tag_channel_map: Dict[str, int] = {}
+        # 受信処理から参照するタグマッピングの読み取り専用コピー (変更のたびに差し替える)
+        self.tag_snapshot: Mapping[str, int] = MappingProxyType({})
+        # タグマッピングが変わるたびに増える (パーサーのタグキャッシュ無効化用)
+        self.mapping_version: int = 0
         self.osc_ip: str = "127.0.0.1"
         self.osc_port: int = 8000
         self.websocket_port: int = 3031
         self.timeout_seconds: int = 20  # デフォルトタイムアウト20秒
+        self.osc_bundle: bool = False  # 複数チャンネルを1つのOSCバンドルで送信
+        self.osc_async: bool = False  # asyncioデータグラムトランスポートで送信
+        self.osc_send_queue_size: int = 256  # 非同期送信キューの上限
+        self.osc_drop_policy: str = "drop_oldest"  # キュー満杯時: drop_oldest / drop_newest
+        self.output_rate_hz: int = 0  # 出力ティック (Hz)。0 は受信ごとに即時送信
+        self.deadband_epsilon: float = 0.0  # 前回送信値との差がこれ以下なら送信しない
+        self.keepalive_seconds: float = 1.0  # 同じ値でもこの間隔で再送 (0で再送しない)
+        self.decay_mode: str = "none"  # タイムアウト後の減衰: none / linear / exponential
+        self.decay_seconds: float = 1.0  # 減衰時間 (linear: 0までの時間, exponential: 時定数)
+        self.coalesce_frames: bool = True  # 接続ごとに滞留した受信フレームを最新値にまとめて処理
+        self.merge_policy: str = "latest"  # 複数クライアントの合成: max / sum / latest / priority
+        self.channel_merge_policies: Dict[str, str] = {}  # チャンネル別の合成ポリシー {"3": "max"}
+        self.max_clients: int = 16  # 同時接続数の上限 (0で無制限)
+        self.client_max_fps: float = 0.0  # クライアントごとの受信フレーム数/秒の上限 (0で無制限)
+        self.client_max_bytes_per_sec: float = 0.0  # クライアントごとの受信バイト数/秒の上限 (0で無制限)
+        self.rate_limit_action: str = "drop"  # 上限を超えたフレーム: drop / throttle
+        self.latency_window: int = 1024  # 遅延の集計に使う直近の件数
+        self.latency_trace_sample: int = 0  # Nフレームに1つの遅延をログに出力 (0で無効)
+        self.capture_file: str = ""  # 受信トラフィックの記録先 (strftime 形式, 空で記録しない)
+        self.event_loop: str = "auto"  # イベントループ: auto (uvloopがあれば使用) / asyncio / uvloop
+        self.log_capacity: int = 500  # GUIのログパネルに保持する行数
+        self.log_refresh_hz: float = 4.0  # ログパネルの更新回数/秒の上限
+        self.log_file: str = ""  # ログパネルから溢れた行の書き出し先 (空で書き出さない)
+        self.log_file_max_bytes: int = 1048576  # 書き出し先のローテーションサイズ
+        self.log_file_backups: int = 3  # ローテーションで残すファイル数
+        self.meter_refresh_hz: float = 15.0  # チャンネルメーターの更新回数/秒の上限 (0で更新しない)
+        # 保存はバックグラウンドでまとめて書き込む
+        self._writer = ConfigWriter(config_file)
         self.load_config()
     
     def load_config(self) -> None:
@@ -27,10 +62,37 @@ class Config:
                 with open(self.config_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     self.tag_channel_map = data.get('tag_channel_map', {})
+                    self._mapping_changed()
                     self.osc_ip = data.get('osc_ip', '127.0.0.1')
                     self.osc_port = data.get('osc_port', 8000)
                     self.websocket_port = data.get('websocket_port', 3031)
                     self.timeout_seconds = data.get('timeout_seconds', 20)
+                    self.osc_bundle = data.get('osc_bundle', False)
+                    self.osc_async = data.get('osc_async', False)
+                    self.osc_send_queue_size = data.get('osc_send_queue_size', 256)
+                    self.osc_drop_policy = data.get('osc_drop_policy', 'drop_oldest')
+                    self.output_rate_hz = data.get('output_rate_hz', 0)
+                    self.deadband_epsilon = data.get('deadband_epsilon', 0.0)
+                    self.keepalive_seconds = data.get('keepalive_seconds', 1.0)
+                    self.decay_mode = data.get('decay_mode', 'none')
+                    self.decay_seconds = data.get('decay_seconds', 1.0)
+                    self.coalesce_frames = data.get('coalesce_frames', True)
+                    self.merge_policy = data.get('merge_policy', 'latest')
+                    self.channel_merge_policies = data.get('channel_merge_policies', {})
+                    self.max_clients = data.get('max_clients', 16)
+                    self.client_max_fps = data.get('client_max_fps', 0.0)
+                    self.client_max_bytes_per_sec = data.get('client_max_bytes_per_sec', 0.0)
+                    self.rate_limit_action = data.get('rate_limit_action', 'drop')
+                    self.latency_window = data.get('latency_window', 1024)
+                    self.latency_trace_sample = data.get('latency_trace_sample', 0)
+                    self.capture_file = data.get('capture_file', '')
+                    self.event_loop = data.get('event_loop', 'auto')
+                    self.log_capacity = data.get('log_capacity', 500)
+                    self.log_refresh_hz = data.get('log_refresh_hz', 4.0)
+                    self.log_file = data.get('log_file', '')
+                    self.log_file_max_bytes = data.get('log_file_max_bytes', 1048576)
+                    self.log_file_backups = data.get('log_file_backups', 3)
+                    self.meter_refresh_hz = data.get('meter_refresh_hz', 15.0)
                 print(f"設定を読み込みました: {self.config_file}")
             except Exception as e:
                 print(f"設定ファイル読み込みエラー: {e}")
@@ -39,21 +101,59 @@ class Config:
             self._create_default_config()
     
     def save_config(self) -> None:
-        """設定をファイルに保存"""
+        """
+        設定をファイルに保存
+
+        現在の内容をコピーして書き込みスレッドに渡すだけで戻る。続けて保存した場合は
+        最後の内容で1回だけ書き込む。書き込みの完了を待つ場合は flush() を呼び出す。
+        """
         try:
             data = {
-                'tag_channel_map': self.tag_channel_map,
+                'tag_channel_map': dict(self.tag_channel_map),
                 'osc_ip': self.osc_ip,
                 'osc_port': self.osc_port,
                 'websocket_port': self.websocket_port,
-                'timeout_seconds': self.timeout_seconds
+                'timeout_seconds': self.timeout_seconds,
+                'osc_bundle': self.osc_bundle,
+                'osc_async': self.osc_async,
+                'osc_send_queue_size': self.osc_send_queue_size,
+                'osc_drop_policy': self.osc_drop_policy,
+                'output_rate_hz': self.output_rate_hz,
+                'deadband_epsilon': self.deadband_epsilon,
+                'keepalive_seconds': self.keepalive_seconds,
+                'decay_mode': self.decay_mode,
+                'decay_seconds': self.decay_seconds,
+                'coalesce_frames': self.coalesce_frames,
+                'merge_policy': self.merge_policy,
+                'channel_merge_policies': dict(self.channel_merge_policies),
+                'max_clients': self.max_clients,
+                'client_max_fps': self.client_max_fps,
+                'client_max_bytes_per_sec': self.client_max_bytes_per_sec,
+                'rate_limit_action': self.rate_limit_action,
+                'latency_window': self.latency_window,
+                'latency_trace_sample': self.latency_trace_sample,
+                'capture_file': self.capture_file,
+                'event_loop': self.event_loop,
+                'log_capacity': self.log_capacity,
+                'log_refresh_hz': self.log_refresh_hz,
+                'log_file': self.log_file,
+                'log_file_max_bytes': self.log_file_max_bytes,
+                'log_file_backups': self.log_file_backups,
+                'meter_refresh_hz': self.meter_refresh_hz
             }
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            print(f"設定を保存しました: {self.config_file}")
+            self._writer.save(data)
         except Exception as e:
             print(f"設定ファイル保存エラー: {e}")
     
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """保存待ちの内容の書き込み完了を待つ"""
+        return self._writer.flush(timeout)
+    
+    def _mapping_changed(self) -> None:
+        """タグマッピングの変更を受信処理へ反映 (読み取り専用コピーを差し替えてから版を進める)"""
+        self.tag_snapshot = MappingProxyType(dict(self.tag_channel_map))
+        self.mapping_version += 1
+    
     def _create_default_config(self) -> None:
         """デフォルト設定を作成"""
         self.tag_channel_map = {
@@ -61,6 +161,7 @@ class Config:
             "b": 1,
             "c": 3
         }
+        self._mapping_changed()
         self.osc_ip = "127.0.0.1"
         self.osc_port = 8000
         self.websocket_port = 3031
@@ -70,6 +171,7 @@ class Config:
         """タグとチャンネルのマッピングを追加"""
         if 0 <= channel <= 15:
             self.tag_channel_map[tag] = channel
+            self._mapping_changed()
             print(f"マッピング追加: {tag} -> チャンネル {channel}")
         else:
             raise ValueError("チャンネル番号は0-15の範囲で指定してください")
@@ -78,11 +180,12 @@ class Config:
         """タグマッピングを削除"""
         if tag in self.tag_channel_map:
             del self.tag_channel_map[tag]
+            self._mapping_changed()
             print(f"マッピング削除: {tag}")
     
     def get_channel_for_tag(self, tag: str) -> Optional[int]:
-        """タグに対応するチャンネル番号を取得"""
-        return self.tag_channel_map.get(tag)
+        """タグに対応するチャンネル番号を取得 (読み取り専用コピーを参照するためロック不要)"""
+        return self.tag_snapshot.get(tag)
     
     def set_osc_target(self, ip: str, port: int = 8000) -> None:
         """OSC送信先を設定"""
@@ -93,6 +196,11 @@ class Config:
     def get_osc_target(self) -> tuple:
         """OSC送信先を取得"""
         return (self.osc_ip, self.osc_port)
+    
+    def set_osc_bundle(self, enabled: bool) -> None:
+        """OSCバンドル送信の有効/無効を設定"""
+        self.osc_bundle = bool(enabled)
+        print(f"OSCバンドル送信設定: {'有効' if self.osc_bundle else '無効'}")
         
     def set_timeout_seconds(self, seconds: int) -> None:
         """タイムアウト秒数を設定"""
@@ -101,6 +209,14 @@ class Config:
             print(f"タイムアウト設定: {seconds}秒")
         else:
             raise ValueError("タイムアウト秒数は1以上の値を指定してください")
+    
+    def set_output_rate_hz(self, rate_hz: int) -> None:
+        """出力ティックレートを設定 (0 は即時送信)"""
+        if 0 <= rate_hz <= 1000:
+            self.output_rate_hz = rate_hz
+            print(f"出力レート設定: {rate_hz}Hz" if rate_hz else "出力レート設定: 即時送信")
+        else:
+            raise ValueError("出力レートは0-1000Hzの範囲で指定してください")
 
 if __name__ == "__main__":
     # テスト用コード
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+設定ファイルの書き込みモジュール
+保存要求をまとめてバックグラウンドスレッドで書き込み、一時ファイル経由で置き換えることで
+書き込み途中にプロセスが終了しても設定ファイルが壊れないようにする
+"""
+
+import atexit
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Optional
+
+# 最初の保存要求から書き込むまでの待ち時間 (秒)。この間の保存要求は最後の内容で1回だけ書き込む
+SAVE_DELAY = 0.5
+
+
+class ConfigWriter:
+    """
+    設定ファイルの遅延書き込みクラス
+
+    save() は書き込む内容を受け取るだけで戻る。書き込みは一時ファイルに書いて fsync してから
+    os.replace で置き換える。flush() で保留中の書き込みの完了を待てる。
+    プロセス終了時には保留中の内容を書き込む。
+    """
+
+    def __init__(self, path: str, delay: float = SAVE_DELAY):
+        self.path = path
+        self.delay = delay
+        self.writes = 0
+        self.errors = 0
+        self._pending: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._now = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def save(self, data: dict) -> None:
+        """書き込む内容を設定 (呼び出し元から変更されないコピーを渡す)"""
+        with self._lock:
+            if self._closed:
+                # 終了後は待たずに書き込む
+                self._write(data)
+                return
+            self._pending = data
+            self._idle.clear()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="config-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        self._wakeup.set()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """保留中の書き込みをすぐに行い、完了を待つ (タイムアウトした場合は False)"""
+        if self._idle.is_set():
+            return True
+        self._now.set()
+        self._wakeup.set()
+        return self._idle.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """保留中の内容を書き込んでスレッドを終了"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        self._now.set()
+        self._wakeup.set()
+        thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            # 続けて届く保存要求をまとめる (flush / close の場合は待たない)
+            self._now.wait(self.delay)
+            self._wakeup.clear()
+            with self._lock:
+                data, self._pending = self._pending, None
+            if data is not None:
+                self._write(data)
+            with self._lock:
+                if self._pending is None:
+                    self._idle.set()
+                    if self._closed:
+                        return
+                    self._now.clear()
+
+    def _write(self, data: dict) -> None:
+        """一時ファイルに書き込んで fsync し、設定ファイルと置き換える"""
+        path = os.path.abspath(self.path)
+        directory = os.path.dirname(path)
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                # mkstemp は所有者のみ読み書き可能で作成するため、既存ファイルの権限に合わせる
+                mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+                os.chmod(temp_path, mode)
+                os.replace(temp_path, path)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.unlink(temp_path)
+                raise
+            _fsync_directory(directory)
+            self.writes += 1
+            logging.info(f"設定を保存しました: {self.path}")
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"設定ファイル保存エラー: {e}")
+
+
+def _fsync_directory(directory: str) -> None:
+    """置き換えたファイル名をディレクトリに確定させる (Windows では不要なため何もしない)"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+イベントループ選択モジュール
+設定に応じて uvloop などの高速なイベントループを使用し、
+インストールされていない場合は標準の asyncio イベントループにフォールバックする
+"""
+
+import asyncio
+import logging
+from typing import Callable, Tuple
+
+EVENT_LOOP_AUTO = "auto"        # uvloop があれば使用、なければ標準
+EVENT_LOOP_ASYNCIO = "asyncio"  # 標準の asyncio イベントループ
+EVENT_LOOP_UVLOOP = "uvloop"    # uvloop (未インストールの場合は警告して標準)
+EVENT_LOOPS = (EVENT_LOOP_AUTO, EVENT_LOOP_ASYNCIO, EVENT_LOOP_UVLOOP)
+
+
+def get_loop_factory(name: str) -> Tuple[Callable[[], asyncio.AbstractEventLoop], str]:
+    """
+    イベントループの生成関数と、実際に使用する実装名を取得
+
+    Args:
+        name: auto / asyncio / uvloop
+    """
+    if name not in EVENT_LOOPS:
+        logging.warning(f"不明なイベントループ: {name} ({EVENT_LOOP_ASYNCIO} を使用します)")
+        return asyncio.new_event_loop, EVENT_LOOP_ASYNCIO
+    if name != EVENT_LOOP_ASYNCIO:
+        try:
+            import uvloop
+            return uvloop.new_event_loop, EVENT_LOOP_UVLOOP
+        except ImportError:
+            if name == EVENT_LOOP_UVLOOP:
+                logging.warning("uvloop がインストールされていないため標準のイベントループを使用します")
+    return asyncio.new_event_loop, EVENT_LOOP_ASYNCIO
+
+
+def new_event_loop(name: str = EVENT_LOOP_AUTO) -> asyncio.AbstractEventLoop:
+    """設定したイベントループを作成"""
+    factory, actual = get_loop_factory(name)
+    logging.debug(f"イベントループ: {actual}")
+    return factory()
+
+
+def run(coroutine, name: str = EVENT_LOOP_AUTO):
+    """設定したイベントループでコルーチンを実行 (asyncio.run と同様)"""
+    factory, actual = get_loop_factory(name)
+    logging.debug(f"イベントループ: {actual}")
+    with asyncio.Runner(loop_factory=factory) as runner:
+        return runner.run(coroutine)
+
+
+def loop_name(loop: asyncio.AbstractEventLoop) -> str:
+    """イベントループの実装名 (uvloop / asyncio)"""
+    return type(loop).__module__.split(".")[0]
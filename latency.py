@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+遅延計測モジュール
+WebSocketフレームの受信からOSC送信までの各段階の所要時間を直近の一定件数で集計する
+
+段階 (time.perf_counter_ns() 基準):
+    parse    : 受信 → 解析 (タグ→チャンネル解決を含む)
+    map      : 解析 → チャンネル値への反映 (合成・タイムアウト期限の更新)
+    schedule : 反映 → 送信開始 (出力ティック使用時はティックまでの待ち時間)
+    send     : 送信開始 → UDP送信完了
+    total    : 受信 → UDP送信完了
+"""
+
+import logging
+from array import array
+from typing import Dict
+from channel_state import CHANNEL_COUNT, iter_channels
+
+STAGE_PARSE = "parse"
+STAGE_MAP = "map"
+STAGE_SCHEDULE = "schedule"
+STAGE_SEND = "send"
+STAGE_TOTAL = "total"
+STAGES = (STAGE_PARSE, STAGE_MAP, STAGE_SCHEDULE, STAGE_SEND, STAGE_TOTAL)
+
+
+class RollingWindow:
+    """直近 size 件の値 (ナノ秒) を保持するリングバッファ"""
+
+    __slots__ = ("samples", "size", "index", "count")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.samples = array('q', bytes(8 * size))
+        self.index = 0
+        self.count = 0
+
+    def add(self, value_ns: int) -> None:
+        self.samples[self.index] = value_ns
+        self.index += 1
+        if self.index == self.size:
+            self.index = 0
+        if self.count < self.size:
+            self.count += 1
+
+    def summary(self) -> Dict[str, float]:
+        """p50/p99/max (マイクロ秒) と件数"""
+        if not self.count:
+            return {'p50_us': 0.0, 'p99_us': 0.0, 'max_us': 0.0, 'count': 0}
+        ordered = sorted(self.samples[:self.count])
+        last = self.count - 1
+        return {
+            'p50_us': round(ordered[last * 50 // 100] / 1000, 1),
+            'p99_us': round(ordered[last * 99 // 100] / 1000, 1),
+            'max_us': round(ordered[last] / 1000, 1),
+            'count': self.count,
+        }
+
+
+class LatencyTracker:
+    """
+    受信から送信までの遅延計測クラス
+
+    WebSocketサーバーがフレームごとに record_parse() で解析時間を、
+    ハンドラー呼び出しの直前に mark_frame() で受信・解析完了時刻を記録し、
+    ブリッジが mark_mapped() でチャンネルごとに反映時刻を、mark_sent() で送信時刻を記録する。
+    滞留フレームの集約や出力ティックで複数フレームの値がまとめて送られる場合は、
+    最も古い受信時刻で計測する。
+    sample_every を 1 以上にすると、N フレームに1つの段階ごとの時刻をログに出力する。
+    """
+
+    def __init__(self, window: int = 1024, sample_every: int = 0):
+        self.windows = {stage: RollingWindow(max(1, window)) for stage in STAGES}
+        self.sample_every = sample_every
+        # 処理中のフレーム
+        self.frame_received_ns = 0
+        self.frame_parsed_ns = 0
+        # チャンネルごとの未送信の値の受信・反映時刻 (0 は計測対象なし)
+        self.received_ns = array('q', bytes(8 * CHANNEL_COUNT))
+        self.mapped_ns = array('q', bytes(8 * CHANNEL_COUNT))
+        # サンプリング中のフレーム (1つだけ追跡)
+        self._frame_count = 0
+        self._sampling = False
+        self._trace_mask = 0
+        self._trace = None
+
+    def record_parse(self, duration_ns: int) -> None:
+        """1フレームの解析時間を記録"""
+        self.windows[STAGE_PARSE].add(duration_ns)
+
+    def mark_frame(self, received_ns: int, parsed_ns: int) -> None:
+        """受信・解析完了時刻を記録 (ハンドラー呼び出しの直前)"""
+        self.frame_received_ns = received_ns
+        self.frame_parsed_ns = parsed_ns
+        if self.sample_every > 0:
+            self._frame_count += 1
+            self._sampling = self._trace is None and self._frame_count % self.sample_every == 0
+
+    def mark_mapped(self, mask: int, now_ns: int) -> None:
+        """チャンネル値への反映時刻を記録"""
+        received = self.frame_received_ns
+        if not received:
+            return
+        self.frame_received_ns = 0
+        self.windows[STAGE_MAP].add(now_ns - self.frame_parsed_ns)
+        received_ns = self.received_ns
+        mapped_ns = self.mapped_ns
+        for channel in iter_channels(mask):
+            # 未送信の値が残っている場合は古い方の受信時刻を残す
+            if not mapped_ns[channel]:
+                received_ns[channel] = received
+                mapped_ns[channel] = now_ns
+        if self._sampling:
+            self._sampling = False
+            self._trace_mask = mask
+            self._trace = (received, self.frame_parsed_ns, now_ns)
+
+    def mark_sent(self, mask: int, scheduled_ns: int, sent_ns: int) -> None:
+        """送信時刻を記録 (1回の送信につき各段階1件)"""
+        received_ns = self.received_ns
+        mapped_ns = self.mapped_ns
+        oldest_received = 0
+        oldest_mapped = 0
+        for channel in iter_channels(mask):
+            mapped = mapped_ns[channel]
+            if not mapped:
+                continue
+            if not oldest_mapped or mapped < oldest_mapped:
+                oldest_mapped = mapped
+            received = received_ns[channel]
+            if not oldest_received or received < oldest_received:
+                oldest_received = received
+            mapped_ns[channel] = 0
+        if not oldest_mapped:
+            # タイムアウト・減衰・再送など受信フレームに由来しない送信
+            return
+        windows = self.windows
+        windows[STAGE_SCHEDULE].add(scheduled_ns - oldest_mapped)
+        windows[STAGE_SEND].add(sent_ns - scheduled_ns)
+        windows[STAGE_TOTAL].add(sent_ns - oldest_received)
+        if self._trace is not None and mask & self._trace_mask:
+            self._log_trace(mask & self._trace_mask, scheduled_ns, sent_ns)
+
+    def discard(self, mask: int) -> None:
+        """送信されなかったチャンネル (抑制・停止時) の計測を破棄"""
+        for channel in iter_channels(mask):
+            self.mapped_ns[channel] = 0
+        if self._trace is not None:
+            self._trace_mask &= ~mask
+            if not self._trace_mask:
+                self._trace = None
+
+    def _log_trace(self, mask: int, scheduled_ns: int, sent_ns: int) -> None:
+        received, parsed, mapped = self._trace
+        self._trace = None
+        self._trace_mask = 0
+        logging.info(
+            f"遅延トレース ch{list(iter_channels(mask))}: "
+            f"解析 {(parsed - received) / 1000:.1f}µs, "
+            f"反映 {(mapped - parsed) / 1000:.1f}µs, "
+            f"送信待ち {(scheduled_ns - mapped) / 1000:.1f}µs, "
+            f"送信 {(sent_ns - scheduled_ns) / 1000:.1f}µs, "
+            f"合計 {(sent_ns - received) / 1000:.1f}µs"
+        )
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """段階ごとの p50/p99/max (マイクロ秒)"""
+        return {stage: window.summary() for stage, window in self.windows.items()}
+
+    def reset(self) -> None:
+        """未送信の計測を破棄"""
+        self.frame_received_ns = 0
+        self.received_ns[:] = array('q', bytes(8 * CHANNEL_COUNT))
+        self.mapped_ns[:] = array('q', bytes(8 * CHANNEL_COUNT))
+        self._sampling = False
+        self._trace = None
+        self._trace_mask = 0
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+ログ出力パイプライン
+ログレコードはキューに入れるだけでイベントループに戻り、整形・出力はバックグラウンドスレッドで行う。
+同じメッセージの繰り返しはまとめて件数を出力し、GUIへはまとめて数回/秒で渡す。
+"""
+
+import collections
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+# ログキューの上限 (超えた分は破棄してループを止めない)
+LOG_QUEUE_SIZE = 10000
+# 同じメッセージを繰り返し出力しない間隔 (秒)
+REPEAT_INTERVAL = 5.0
+# GUIへまとめて渡す間隔 (秒)
+GUI_FLUSH_INTERVAL = 0.25
+# GUIのログパネルに保持する行数
+LOG_CAPACITY = 500
+
+
+class _RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    レコードを整形せずにキューへ入れるハンドラー
+
+    標準の QueueHandler はプロセス間で渡せるよう呼び出し元でメッセージを整形するが、
+    同じプロセス内のスレッドに渡すだけなので整形はリスナー側に任せる。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _RepeatSuppressor:
+    """
+    同じメッセージの繰り返しを抑制
+
+    同じレベル・メッセージのレコードは REPEAT_INTERVAL 秒に1回だけ通し、
+    その間に抑制した件数を次に通すときのメッセージに付ける。
+    """
+
+    def __init__(self, interval: float = REPEAT_INTERVAL):
+        self.interval = interval
+        self.suppressed = 0
+        self._last: Dict[tuple, List] = {}  # (level, message) -> [最終出力時刻, 抑制件数]
+
+    def check(self, record: logging.LogRecord) -> bool:
+        """出力する場合は True (抑制件数をメッセージに付ける)"""
+        if self.interval <= 0:
+            return True
+        message = record.getMessage()
+        key = (record.levelno, message)
+        now = time.monotonic()
+        entry = self._last.get(key)
+        if entry is not None and now - entry[0] < self.interval:
+            entry[1] += 1
+            self.suppressed += 1
+            return False
+        if entry is not None and entry[1]:
+            message = f"{message} (直前の{self.interval:g}秒間に同じメッセージ {entry[1]}件を省略)"
+        record.msg = message
+        record.args = None
+        self._last[key] = [now, 0]
+        if len(self._last) > 1024:
+            # 古いエントリを捨ててメモリを一定に保つ
+            self._last = {k: v for k, v in self._last.items() if now - v[0] < self.interval}
+        return True
+
+
+class _SuppressingListener(logging.handlers.QueueListener):
+    """繰り返しを抑制してからハンドラーへ渡すリスナー"""
+
+    def __init__(self, log_queue: queue.Queue, handlers, suppressor: _RepeatSuppressor):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.suppressor = suppressor
+
+    def handle(self, record: logging.LogRecord) -> None:
+        if self.suppressor.check(record):
+            super().handle(record)
+
+
+class BatchingHandler(logging.Handler):
+    """
+    整形したログ行を溜めて、GUI_FLUSH_INTERVAL 秒ごとにまとめてコールバックへ渡すハンドラー
+
+    コールバックは専用スレッドから呼び出す (GUIスレッドへの受け渡しはコールバック側で行う)。
+    """
+
+    def __init__(self, callback: Callable[[List[str]], None], interval: float = GUI_FLUSH_INTERVAL,
+                 level: int = logging.NOTSET):
+        super().__init__(level)
+        self.callback = callback
+        self.interval = interval
+        self._lines: List[str] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-batch", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            self._lines.append(line)
+
+    def flush(self) -> None:
+        """溜まっている行をコールバックへ渡す"""
+        with self.lock:
+            lines, self._lines = self._lines, []
+        if lines:
+            try:
+                self.callback(lines)
+            except Exception:
+                # GUIの状態によらずログ出力を止めない
+                pass
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        super().close()
+
+
+class LogRing:
+    """
+    固定長のログ行バッファ
+
+    容量を超えた古い行は捨て、spill_file を指定した場合はローテーションするファイルへ書き出す。
+    行数・メモリは容量で一定に保たれる。
+    """
+
+    def __init__(self, capacity: int = LOG_CAPACITY):
+        self.capacity = max(1, capacity)
+        self.evicted = 0
+        self._lines: collections.deque = collections.deque(maxlen=self.capacity)
+        self._spill: Optional[logging.Handler] = None
+        self._lock = threading.Lock()
+
+    def configure(self, capacity: int, spill_file: str = "", max_bytes: int = 0, backups: int = 0) -> None:
+        """容量と書き出し先を変更 (容量を減らした場合は古い行から書き出す)"""
+        with self._lock:
+            capacity = max(1, capacity)
+            if capacity != self.capacity:
+                self._evict(len(self._lines) - capacity)
+                self.capacity = capacity
+                self._lines = collections.deque(self._lines, maxlen=capacity)
+            spill = self._spill
+            path = os.path.abspath(spill_file) if spill_file else None
+            if spill is None or spill.baseFilename != path:
+                if spill is not None:
+                    spill.close()
+                    spill = None
+                if spill_file:
+                    spill = logging.handlers.RotatingFileHandler(
+                        spill_file, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+                    spill.setFormatter(logging.Formatter('%(message)s'))
+                self._spill = spill
+            elif spill is not None:
+                spill.maxBytes = max_bytes
+                spill.backupCount = backups
+
+    def extend(self, lines: List[str]) -> None:
+        """行を追加し、溢れた行を書き出す"""
+        with self._lock:
+            overflow = len(lines) - self.capacity
+            if overflow > 0:
+                # 追加する行だけで容量を超える場合は、保持している行と追加する行の先頭を書き出す
+                self._evict(len(self._lines))
+                self._write_spill(lines[:overflow])
+                self.evicted += overflow
+                lines = lines[overflow:]
+            else:
+                self._evict(len(self._lines) - self.capacity + len(lines))
+            self._lines.extend(lines)
+
+    def clear(self) -> None:
+        """全行を書き出して空にする"""
+        with self._lock:
+            self._evict(len(self._lines))
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            return list(self._lines)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+
+    def _evict(self, count: int) -> None:
+        """保持している古い行から count 行を取り除いて書き出す"""
+        if count <= 0:
+            return
+        popleft = self._lines.popleft
+        self._write_spill([popleft() for _ in range(count)])
+        self.evicted += count
+
+    def _write_spill(self, lines: List[str]) -> None:
+        if self._spill is None:
+            return
+        for line in lines:
+            self._spill.handle(logging.makeLogRecord({'msg': line}))
+
+
+class LogPipeline:
+    """
+    ルートロガーの出力をキュー経由に切り替える
+
+    呼び出し元のスレッドでは LogRecord をキューに入れるだけで、整形・繰り返しの抑制・
+    ハンドラーへの出力はリスナースレッドで行う。キューが満杯の場合は破棄して dropped に計上する。
+    """
+
+    def __init__(self, handlers: Iterable[logging.Handler], level: int = logging.INFO,
+                 queue_size: int = LOG_QUEUE_SIZE, repeat_interval: float = REPEAT_INTERVAL):
+        self.handlers = list(handlers)
+        self.level = level
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._queue_handler = _RecordQueueHandler(self._queue)
+        self._suppressor = _RepeatSuppressor(repeat_interval)
+        self._listener: Optional[_SuppressingListener] = None
+
+    @property
+    def dropped(self) -> int:
+        """キューが満杯で破棄したレコード数"""
+        return self._queue_handler.dropped
+
+    @property
+    def suppressed(self) -> int:
+        """繰り返しとして抑制したレコード数"""
+        return self._suppressor.suppressed
+
+    def start(self) -> 'LogPipeline':
+        """ルートロガーのハンドラーを置き換えてリスナーを開始"""
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(self._queue_handler)
+        root.setLevel(self.level)
+        self._listener = _SuppressingListener(self._queue, self.handlers, self._suppressor)
+        self._listener.start()
+        return self
+
+    def stop(self) -> None:
+        """残りのレコードを出力してリスナーを停止"""
+        if self._listener is None:
+            return
+        logging.getLogger().removeHandler(self._queue_handler)
+        self._listener.stop()
+        self._listener = None
+        for handler in self.handlers:
+            handler.close()
+
+
+def setup_logging(level: int = logging.INFO, handlers: Optional[Iterable[logging.Handler]] = None,
+                  fmt: str = '%(asctime)s - %(levelname)s - %(message)s') -> LogPipeline:
+    """
+    キュー経由のログ出力を開始
+
+    Args:
+        level: ルートロガーのレベル
+        handlers: 出力先 (省略時は標準エラー)。フォーマッター未設定のハンドラーには fmt を設定する
+    """
+    handlers = list(handlers) if handlers else [logging.StreamHandler()]
+    formatter = logging.Formatter(fmt)
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(formatter)
+    return LogPipeline(handlers, level).start()
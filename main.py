@@ -7,18 +7,20 @@ WebSocket to OSC Bridge - Flet GUI Application
 import flet as ft
 import logging
 import asyncio
-import threading
 import logging
 from typing import Optional
+import log_pipeline
 from bridge import WebSocketOSCBridge
+from runtime import BridgeRuntime
+from channel_state import CHANNEL_COUNT
 
 class WebSocketOSCBridgeApp:
     """Flet GUI アプリケーションクラス"""
     
     def __init__(self):
         self.bridge: Optional[WebSocketOSCBridge] = None
-        self.bridge_thread: Optional[threading.Thread] = None
-        self.bridge_loop: Optional[asyncio.AbstractEventLoop] = None
+        # ブリッジ専用のスレッドとイベントループ (ページ作成時に1回だけ作成)
+        self.runtime: Optional[BridgeRuntime] = None
         self.is_bridge_running = False
         
         # UI コンポーネント
@@ -28,6 +30,8 @@ class WebSocketOSCBridgeApp:
         self.tag_list: Optional[ft.ListView] = None
         self.osc_ip_input: Optional[ft.TextField] = None
         self.osc_port_input: Optional[ft.TextField] = None
+        self.osc_bundle_switch: Optional[ft.Switch] = None
+        self.output_rate_dropdown: Optional[ft.Dropdown] = None
         self.status_text: Optional[ft.Text] = None
         self.ws_status_chip: Optional[ft.Chip] = None
         self.osc_status_chip: Optional[ft.Chip] = None
@@ -35,8 +39,14 @@ class WebSocketOSCBridgeApp:
         self.ws_port_input: Optional[ft.TextField] = None
         self.endpoint_text: Optional[ft.Text] = None
         self.log_text: Optional[ft.Text] = None
+        self.log_list: Optional[ft.ListView] = None
+        self.meter_panel: Optional[ft.Container] = None
+        self.meter_bars: list = []
+        self.meter_texts: list = []
         self.start_button: Optional[ft.ElevatedButton] = None
         self.stop_button: Optional[ft.ElevatedButton] = None
+        # ログパネルへ出力するハンドラー (main() で設定)
+        self.log_handler: Optional['_GuiLogHandler'] = None
     
     def main(self, page: ft.Page):
         """メインアプリケーション"""
@@ -49,6 +59,10 @@ class WebSocketOSCBridgeApp:
         
         # ブリッジ初期化
         self.bridge = WebSocketOSCBridge()
+        # コマンドの完了コールバックはページのスレッドで呼び出す
+        self.runtime = BridgeRuntime(self.bridge, self.bridge.config.event_loop, dispatch=self.page.run_thread)
+        if self.log_handler:
+            self.log_handler.configure(self.bridge.config)
         
         # UI構築
         self.build_ui()
@@ -56,6 +70,7 @@ class WebSocketOSCBridgeApp:
         
         # 定期更新タイマー
         self.page.run_task(self.periodic_update)
+        self.page.run_task(self.meter_update)
     
     def build_ui(self):
         """UI構築"""
@@ -99,6 +114,8 @@ class WebSocketOSCBridgeApp:
                 content=ft.Column([
                     self.create_control_panel(),
                     ft.Divider(height=20),
+                    self.create_meter_panel(),
+                    ft.Divider(height=20),
                     self.create_log_panel(),
                 ], scroll=ft.ScrollMode.AUTO),
                 expand=True,
@@ -130,10 +147,12 @@ class WebSocketOSCBridgeApp:
         )
         
         self.client_count_text = ft.Text("接続数: 0", size=14)
+        self.latency_text = ft.Text("遅延: -", size=12, color=ft.Colors.GREY_500)
         
         return ft.Column([
             ft.Row([self.ws_status_chip, self.osc_status_chip]),
-            self.client_count_text
+            self.client_count_text,
+            self.latency_text
         ], horizontal_alignment=ft.CrossAxisAlignment.END)
     
     def create_tag_mapping_panel(self):
@@ -219,11 +238,30 @@ class WebSocketOSCBridgeApp:
             on_submit=self.update_osc_target,
             input_filter=ft.InputFilter(r"^\d+$", allow=True)
         )
+        self.osc_bundle_switch = ft.Switch(
+            label="バンドル送信 (1パケットにまとめる)",
+            value=self.bridge.config.osc_bundle,
+            on_change=self.update_osc_bundle
+        )
+        self.output_rate_dropdown = ft.Dropdown(
+            label="出力レート",
+            width=160,
+            value=str(self.bridge.config.output_rate_hz),
+            options=[
+                ft.dropdown.Option("0", "即時送信"),
+                ft.dropdown.Option("30", "30 Hz"),
+                ft.dropdown.Option("60", "60 Hz"),
+                ft.dropdown.Option("120", "120 Hz"),
+            ],
+            on_change=self.update_output_rate
+        )
         return ft.Card(
             content=ft.Container(
                 content=ft.Column([
                     ft.Text("OSC設定", size=20, weight=ft.FontWeight.BOLD),
                     ft.Row([self.osc_ip_input, self.osc_port_input]),
+                    self.osc_bundle_switch,
+                    self.output_rate_dropdown,
                     ft.Row([
                         ft.ElevatedButton(
                             "適用",
@@ -304,14 +342,45 @@ class WebSocketOSCBridgeApp:
             border_radius=10
         )
     
+    def create_meter_panel(self):
+        """チャンネルメーター作成 (8チャンネルずつ2列)"""
+        self.meter_bars = []
+        self.meter_texts = []
+        rows = []
+        for channel in range(CHANNEL_COUNT):
+            bar = ft.ProgressBar(value=0, expand=True, bar_height=8,
+                                 color=ft.Colors.GREY_500, bgcolor=ft.Colors.BLACK12)
+            text = ft.Text("0.00", size=12, width=40, text_align=ft.TextAlign.RIGHT)
+            self.meter_bars.append(bar)
+            self.meter_texts.append(text)
+            rows.append(ft.Row([ft.Text(f"ch{channel}", size=12, width=40), bar, text]))
+        half = CHANNEL_COUNT // 2
+        self.meter_panel = ft.Container(
+            content=ft.Column([
+                ft.Text("チャンネル出力", size=18, weight=ft.FontWeight.BOLD),
+                ft.Row([
+                    ft.Column(rows[:half], expand=True, spacing=4),
+                    ft.Column(rows[half:], expand=True, spacing=4),
+                ], spacing=20)
+            ]),
+            bgcolor=ft.Colors.SURFACE_CONTAINER_HIGHEST,
+            padding=15,
+            border_radius=10
+        )
+        return self.meter_panel
+    
     def create_log_panel(self):
         """ログパネル作成"""
         # ListView に変更して自動スクロールを有効化
         # ログを複数行選択コピーできるよう SelectionArea で包む
         self.log_list = ft.ListView(auto_scroll=True, expand=True, spacing=2)
         log_selection_area = ft.SelectionArea(content=self.log_list)
-        # 初期メッセージ
-        self.log_list.controls.append(ft.Text("ログ出力がここに表示されます...", size=12, selectable=True))
+        # ページ作成前に出力されたログ、なければ初期メッセージ
+        lines = self.log_handler.ring.lines() if self.log_handler else []
+        if lines:
+            self.log_list.controls.extend(ft.Text(line, size=12, selectable=True) for line in lines)
+        else:
+            self.log_list.controls.append(ft.Text("ログ出力がここに表示されます...", size=12, selectable=True))
         
         log_container = ft.Container(
             content=log_selection_area,
@@ -351,9 +420,10 @@ class WebSocketOSCBridgeApp:
             self.show_snackbar("タグ名とチャンネルを入力してください", ft.colors.RED_400)
             return
         
-        try:
-            channel_int = int(channel)
-            self.bridge.add_tag_mapping(tag, channel_int)
+        def on_added(result, error):
+            if error is not None:
+                self.show_snackbar(f"エラー: {error}", ft.colors.RED_400)
+                return
             self.log_message(f"タグマッピング追加: {tag} -> チャンネル {channel_int}")
             self.update_tag_list()
             
@@ -361,9 +431,14 @@ class WebSocketOSCBridgeApp:
             self.tag_input.value = ""
             self.channel_dropdown.value = None
             self.page.update()
-            
-        except Exception as ex:
+        
+        try:
+            channel_int = int(channel)
+        except ValueError as ex:
             self.show_snackbar(f"エラー: {ex}", ft.colors.RED_400)
+            return
+        # 受信処理と同じスレッドで変更する
+        self.runtime.reconfigure(self.bridge.add_tag_mapping, tag, channel_int, callback=on_added)
     
     def update_osc_target(self, e=None):
         """OSC送信先を更新"""
@@ -399,113 +474,70 @@ class WebSocketOSCBridgeApp:
             self.show_snackbar(f"無効なタイムアウト値です: {str(e)}", is_error=True)
     
     def start_bridge(self, e):
-        """ブリッジ開始"""
+        """ブリッジ開始 (開始処理はブリッジのスレッドで行い、完了を待たない)"""
         if self.is_bridge_running:
             return
-        
-        # 事前にイベントループを作成し参照を保持
-        self.bridge_loop = asyncio.new_event_loop()
-
-        def run_bridge():
-            loop = self.bridge_loop
-            asyncio.set_event_loop(loop)
-            try:
-                # ブリッジを開始
-                self.bridge_loop.run_until_complete(self.bridge.start())
-                # 以後はイベントループを走らせ続け、タイムアウトタスクなどを処理
-                self.bridge_loop.run_forever()
-            except Exception as ex:
-                self.log_message(f"ブリッジエラー: {ex}")
-            finally:
-                # 停止指示で run_forever から抜けてきたらループを閉じる
-                self.bridge_loop.close()
-        
-        self.bridge_thread = threading.Thread(target=run_bridge, daemon=True)
-        self.bridge_thread.start()
         self.is_bridge_running = True
-        
-        # ボタン状態更新
-        self.start_button.disabled = True
-        self.stop_button.disabled = False
-        self.page.update()
+        self.set_bridge_buttons(running=True)
+        self.runtime.start_bridge(callback=self.on_bridge_started)
+
+    def on_bridge_started(self, result, error):
+        """ブリッジ開始の完了 (ページのスレッドで呼び出される)"""
+        if error is not None:
+            self.is_bridge_running = False
+            self.set_bridge_buttons(running=False)
+            self.log_message(f"ブリッジエラー: {error}")
+        else:
+            self.log_message("ブリッジを開始しました")
         # インジケーターを即更新
         self.update_status()
-        self.log_message("ブリッジを開始しました")
     
     def stop_bridge(self, e):
-        """ブリッジ停止"""
+        """ブリッジ停止 (停止処理はブリッジのスレッドで行い、完了を待たない)"""
         if not self.is_bridge_running:
             return
-        
-        if not self.bridge_loop:
-            self.log_message("ブリッジ初期化中のため停止できません。数秒後に再度お試しください")
-            return
-
-        if self.bridge_loop and not self.bridge_loop.is_closed():
-            # ブリッジ停止コルーチンを実行
-            fut = asyncio.run_coroutine_threadsafe(self.bridge.stop(), self.bridge_loop)
-            # 停止完了後にイベントループを止める
-            fut.add_done_callback(lambda _:
-                                   self.bridge_loop.call_soon_threadsafe(self.bridge_loop.stop))
-        
         self.is_bridge_running = False
-        
-        # ボタン状態更新
-        self.start_button.disabled = False
-        self.stop_button.disabled = True
-        self.page.update()
-        
-        self.log_message("ブリッジを停止しました")
+        self.set_bridge_buttons(running=False)
+        self.runtime.stop_bridge(callback=self.on_bridge_stopped)
+
+    def on_bridge_stopped(self, result, error):
+        """ブリッジ停止の完了 (ページのスレッドで呼び出される)"""
+        if error is not None:
+            self.log_message(f"ブリッジ停止エラー: {error}")
+        elif result:
+            self.log_message("ブリッジを停止しました")
         # 停止完了後ステータスを更新
         self.update_status()
+
+    def set_bridge_buttons(self, running: bool):
+        """開始・停止ボタンの状態を更新"""
+        self.start_button.disabled = running
+        self.stop_button.disabled = not running
+        self.page.update()
     
     def test_send(self, e):
-        """テスト送信 - タイムアウトも適用されるようにブリッジのイベントループで実行"""
-        try:
-            test_data = {tag: 0.5 for tag in self.bridge.config.tag_channel_map}
-            # ブリッジが動作中かつイベントループが有効な場合はそのループで送信
-            if (self.is_bridge_running and self.bridge_loop 
-                    and not self.bridge_loop.is_closed() 
-                    and self.bridge_loop.is_running()):
-                try:
-                    fut = asyncio.run_coroutine_threadsafe(
-                        self.bridge.handle_websocket_message(test_data),
-                        self.bridge_loop
-                    )
-                    fut.result()  # エラーを拾うために短時間待機して例外を拾う
-                except Exception as ex:
-                    self.log_message(f"テスト送信エラー: {ex}")
-            else:
-                # ブリッジが動いていない場合: 非同期ループなしで送信し、タイマーで0送信をスケジュール
-                asyncio.run(self.bridge.handle_websocket_message(test_data))
-
-                # 既存のタイマーがあればキャンセル
-                if hasattr(self, 'test_timeout_timer') and self.test_timeout_timer and self.test_timeout_timer.is_alive():
-                    self.test_timeout_timer.cancel()
-
-                def send_zeros_later():
-                    zero_values = {ch: 0.0 for ch in self.bridge.config.tag_channel_map.values()}
-                    if zero_values and self.bridge.osc_client.is_connected():
-                        self.bridge.osc_client.send_multiple_values(zero_values)
-                        logging.info(f"(テスト送信) タイムアウトで0を送信: {zero_values}")
-                        # self.log_message(f"(テスト送信) タイムアウトで0を送信: {zero_values}")
-
-                # 新しいタイマーを保持
-                self.test_timeout_timer = threading.Timer(self.bridge.timeout_seconds, send_zeros_later)
-                self.test_timeout_timer.start()
+        """テスト送信 - タイムアウトも適用されるようにブリッジのスレッドで実行"""
+        test_data = {tag: 0.5 for tag in self.bridge.config.tag_channel_map}
+
+        def on_sent(result, error):
+            if error is not None:
+                self.show_snackbar(f"テスト送信エラー: {error}", ft.Colors.RED_400)
+                return
             logging.info(f"テストメッセージ送信: {test_data}")
             self.show_snackbar("テストメッセージを送信しました", ft.Colors.GREEN_400)
-        except Exception as ex:
-            self.show_snackbar(f"テスト送信エラー: {ex}", ft.Colors.RED_400)
+
+        self.runtime.test_send(test_data, callback=on_sent)
     
     def save_config(self, e):
-        """設定保存"""
-        try:
-            self.bridge.save_config()
+        """設定保存 (先に受け付けた設定変更の後に保存する)"""
+        def on_saved(result, error):
+            if error is not None:
+                self.show_snackbar(f"保存エラー: {error}", ft.Colors.RED_400)
+                return
             self.log_message("設定を保存しました")
             self.show_snackbar("設定を保存しました", ft.Colors.GREEN_400)
-        except Exception as ex:
-            self.show_snackbar(f"保存エラー: {ex}", ft.Colors.RED_400)
+
+        self.runtime.reconfigure(self.bridge.save_config, callback=on_saved)
     
     def update_osc_target(self, e):
         """OSC送信先(IP, Port)を適用"""
@@ -515,15 +547,55 @@ class WebSocketOSCBridgeApp:
             port = int(port_text)
             if port <= 0 or port > 65535:
                 raise ValueError("ポート番号は1-65535で指定してください")
-            # ブリッジ側を更新
-            success = self.bridge.update_osc_target(ip, port)
-            if success:
+        except ValueError as ex:
+            self.show_snackbar(f"無効なポート番号です: {ex}", ft.Colors.RED_400)
+            return
+
+        def on_updated(success, error):
+            if error is not None:
+                self.show_snackbar(f"OSC送信先の更新エラー: {error}", ft.Colors.RED_400)
+            elif success:
                 self.show_snackbar("OSC送信先を更新しました", ft.Colors.GREEN_400)
             else:
                 self.show_snackbar("OSCソケットの再作成に失敗しました", ft.Colors.RED_400)
             self.update_status()
-        except ValueError as ex:
-            self.show_snackbar(f"無効なポート番号です: {ex}", ft.Colors.RED_400)
+
+        # ブリッジ側を更新
+        self.runtime.reconfigure(self.bridge.update_osc_target, ip, port, callback=on_updated)
+
+    def update_osc_bundle(self, e=None):
+        """OSCバンドル送信の有効/無効を適用"""
+        enabled = bool(self.osc_bundle_switch.value)
+
+        def on_updated(result, error):
+            if error is not None:
+                self.show_snackbar(f"OSCバンドル設定エラー: {error}", ft.Colors.RED_400)
+                return
+            self.show_snackbar(
+                "OSCバンドル送信を有効にしました" if enabled else "OSCバンドル送信を無効にしました",
+                ft.Colors.GREEN_400
+            )
+
+        self.runtime.reconfigure(self.bridge.set_osc_bundle, enabled, callback=on_updated)
+
+    def update_output_rate(self, e=None):
+        """出力ティックレートを適用"""
+        try:
+            rate_hz = int(self.output_rate_dropdown.value)
+        except (TypeError, ValueError) as ex:
+            self.show_snackbar(f"無効な出力レートです: {ex}", ft.Colors.RED_400)
+            return
+
+        def on_updated(result, error):
+            if error is not None:
+                self.show_snackbar(f"出力レートの設定エラー: {error}", ft.Colors.RED_400)
+                return
+            self.show_snackbar(
+                f"出力レートを {rate_hz}Hz に設定しました" if rate_hz else "出力レートを即時送信に設定しました",
+                ft.Colors.GREEN_400
+            )
+
+        self.runtime.reconfigure(self.bridge.set_output_rate, rate_hz, callback=on_updated)
 
     def update_timeout(self, e):
         """タイムアウト秒数を適用"""
@@ -532,12 +604,18 @@ class WebSocketOSCBridgeApp:
             seconds = int(seconds_text)
             if seconds <= 0:
                 raise ValueError("タイムアウト秒数は1以上を指定してください")
-            self.bridge.timeout_seconds = seconds
-            self.bridge.config.set_timeout_seconds(seconds)
-            self.show_snackbar("タイムアウトを更新しました", ft.Colors.GREEN_400)
-            self.update_status()
         except ValueError as ex:
             self.show_snackbar(f"無効な値: {ex}", ft.Colors.RED_400)
+            return
+
+        def on_updated(result, error):
+            if error is not None:
+                self.show_snackbar(f"タイムアウトの更新エラー: {error}", ft.Colors.RED_400)
+                return
+            self.show_snackbar("タイムアウトを更新しました", ft.Colors.GREEN_400)
+            self.update_status()
+
+        self.runtime.reconfigure(self.bridge.set_timeout_seconds, seconds, callback=on_updated)
 
     def update_ws_port(self, e=None):
         """WebSocket待受ポートを適用"""
@@ -546,51 +624,72 @@ class WebSocketOSCBridgeApp:
             port = int(port_text)
             if port <= 0 or port > 65535:
                 raise ValueError("ポート番号は1-65535で指定してください")
-            success = self.bridge.set_websocket_port(port)
-            if success:
+        except ValueError as ex:
+            self.show_snackbar(f"無効なポート番号です: {ex}", ft.Colors.RED_400)
+            return
+
+        def on_updated(success, error):
+            if error is not None:
+                self.show_snackbar(f"WebSocketポートの更新エラー: {error}", ft.Colors.RED_400)
+            elif success:
                 self.show_snackbar("WebSocketポートを更新しました", ft.Colors.GREEN_400)
                 self.endpoint_text.value = f"ws://localhost:{port}/haptic"
             else:
                 self.show_snackbar("WebSocketポートの更新に失敗しました", ft.Colors.RED_400)
             self.update_status()
-        except ValueError as ex:
-            self.show_snackbar(f"無効なポート番号です: {ex}", ft.Colors.RED_400)
+
+        self.runtime.reconfigure(self.bridge.set_websocket_port, port, callback=on_updated)
 
     def save_osc_timeout_config(self, e):
         """OSC IP/Port とタイムアウトをファイルに保存"""
-        try:
-            # 既存の入力検証ロジックを再利用
-            self.update_osc_target(e)
-            self.update_timeout(e)
-            self.update_ws_port(e)
-            # ブリッジの Config を保存
-            self.bridge.config.save_config()
-            self.show_snackbar("OSC設定とタイムアウトを保存しました", ft.Colors.GREEN_400)
-        except Exception as ex:
-            self.show_snackbar(f"保存失敗: {ex}", ft.Colors.RED_400)
+        # 既存の入力検証ロジックを再利用
+        self.update_osc_target(e)
+        self.update_timeout(e)
+        self.update_ws_port(e)
+        # ブリッジの Config を保存 (上記の変更の後に実行される)
+        self.runtime.reconfigure(
+            self.bridge.config.save_config,
+            callback=self._on_config_saved("OSC設定とタイムアウトを保存しました")
+        )
 
     def save_all_config(self, e):
         """タグマッピング・OSC・タイムアウトをまとめて保存"""
-        try:
-            # 既存の個別保存ロジックを活用
-            self.save_osc_timeout_config(e)
-            self.save_config(e)
-            self.show_snackbar("すべての設定を保存しました", ft.Colors.GREEN_400)
-        except Exception as ex:
-            self.show_snackbar(f"保存失敗: {ex}", ft.Colors.RED_400)
+        # タグマッピングは変更時に反映済みのため、OSC・タイムアウトを反映してから1回だけ保存する
+        self.update_osc_target(e)
+        self.update_timeout(e)
+        self.update_ws_port(e)
+        self.runtime.reconfigure(
+            self.bridge.save_config,
+            callback=self._on_config_saved("すべての設定を保存しました")
+        )
+
+    def _on_config_saved(self, message: str):
+        """保存完了を通知するコールバックを作成"""
+        def on_saved(result, error):
+            if error is not None:
+                self.show_snackbar(f"保存失敗: {error}", ft.Colors.RED_400)
+                return
+            self.show_snackbar(message, ft.Colors.GREEN_400)
+        return on_saved
 
     def reload_config(self, e):
         """設定リロード"""
-        try:
-            self.bridge.config.load_config()
+        def on_loaded(result, error):
+            if error is not None:
+                self.show_snackbar(f"リロードエラー: {error}", ft.Colors.RED_400)
+                return
+            if self.log_handler:
+                self.log_handler.configure(self.bridge.config)
             self.update_display()
             self.log_message("設定をリロードしました")
             self.show_snackbar("設定をリロードしました", ft.Colors.GREEN_400)
-        except Exception as ex:
-            self.show_snackbar(f"リロードエラー: {ex}", ft.Colors.RED_400)
+
+        self.runtime.reconfigure(self.bridge.config.load_config, callback=on_loaded)
     
     def clear_log(self, e):
         """ログクリア"""
+        if self.log_handler:
+            self.log_handler.ring.clear()
         self.log_list.controls.clear()
         self.log_list.controls.append(ft.Text("ログ出力がここに表示されます...", size=12, selectable=True))
         self.page.update()
@@ -624,6 +723,8 @@ class WebSocketOSCBridgeApp:
         self.osc_ip_input.value = status['osc_target'][0]
         self.osc_port_input.value = str(status['osc_target'][1])
         self.timeout_input.value = str(self.bridge.config.timeout_seconds)
+        self.osc_bundle_switch.value = self.bridge.config.osc_bundle
+        self.output_rate_dropdown.value = str(self.bridge.config.output_rate_hz)
         self.ws_port_input.value = str(status['websocket_port'])
         self.endpoint_text.value = f"ws://localhost:{status['websocket_port']}/haptic"
         
@@ -650,13 +751,15 @@ class WebSocketOSCBridgeApp:
     
     def remove_tag_mapping(self, tag: str):
         """タグマッピング削除"""
-        try:
-            self.bridge.remove_tag_mapping(tag)
+        def on_removed(result, error):
+            if error is not None:
+                self.show_snackbar(f"削除エラー: {error}", ft.Colors.RED_400)
+                return
             self.log_message(f"タグマッピング削除: {tag}")
             self.update_tag_list()
             self.page.update()
-        except Exception as ex:
-            self.show_snackbar(f"削除エラー: {ex}", ft.Colors.RED_400)
+
+        self.runtime.reconfigure(self.bridge.remove_tag_mapping, tag, callback=on_removed)
     
     def update_status(self):
         """ステータス更新"""
@@ -682,27 +785,71 @@ class WebSocketOSCBridgeApp:
             self.osc_status_chip.bgcolor = ft.Colors.RED_100
             self.osc_status_chip.color = ft.Colors.RED_800
         
-        # クライアント数
-        self.client_count_text.value = f"接続数: {status['websocket_clients']}"
+        # クライアント数・出力中チャンネル数
+        self.client_count_text.value = (
+            f"接続数: {status['websocket_clients']}  出力中: {len(status['active_channels'])}ch"
+        )
+        
+        # 受信→送信の遅延 (直近の p50 / p99 / 最大)
+        total = status['latency']['total']
+        if total['count']:
+            self.latency_text.value = (
+                f"遅延: p50 {total['p50_us']:.0f}µs / p99 {total['p99_us']:.0f}µs / 最大 {total['max_us']:.0f}µs"
+            )
+        else:
+            self.latency_text.value = "遅延: -"
 
         # ページ更新
         self.page.update()
     
     def log_message(self, message: str):
-        """ログメッセージ追加 (コピー可能)"""
-        import datetime
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        log_line = f"[{timestamp}] {message}"
+        """ログメッセージ追加 (他のログと同じくまとめてログパネルへ表示)"""
+        logging.info(message)
+
+    def log_lines(self, lines):
+        """
+        整形済みのログ行をまとめて追加し、ページ更新は1回だけ行う (ページのスレッドで呼び出す)
+
+        表示する行数はログバッファの容量までとし、古い行から取り除く。
+        """
+        capacity = self.log_handler.ring.capacity if self.log_handler else log_pipeline.LOG_CAPACITY
+        controls = self.log_list.controls
         # ListView へ追加し自動スクロール & コピー可能
-        self.log_list.controls.append(ft.Text(log_line, size=12, selectable=True))
+        controls.extend(ft.Text(line, size=12, selectable=True) for line in lines[-capacity:])
+        if len(controls) > capacity:
+            del controls[:len(controls) - capacity]
         self.page.update()
+
     async def periodic_update(self):
-        """定期的にステータスと UI を更新"""
+        """定期的にステータスと UI を更新 (ページ更新は update_status 内で行う)"""
         while True:
             await asyncio.sleep(2)
             if self.bridge:
                 self.update_status()
-                self.page.update()
+
+    async def meter_update(self):
+        """
+        チャンネルメーターを更新 (meter_refresh_hz 回/秒まで)
+
+        ブリッジのスレッドが更新するチャンネル状態の version を見て、変化した場合だけ
+        値をコピーしてメーターのパネルを更新する。ロックやブリッジのループへの呼び出しは行わない。
+        """
+        version = -1
+        while True:
+            refresh_hz = self.bridge.config.meter_refresh_hz if self.bridge else 0
+            await asyncio.sleep(1.0 / refresh_hz if refresh_hz > 0 else 1.0)
+            if refresh_hz <= 0 or self.meter_panel is None:
+                continue
+            snapshot = self.bridge.channel_state.snapshot_if_changed(version)
+            if snapshot is None:
+                continue
+            version, active, values = snapshot
+            for channel, value in enumerate(values):
+                bar = self.meter_bars[channel]
+                bar.value = min(max(value, 0.0), 1.0)
+                bar.color = ft.Colors.GREEN_400 if active >> channel & 1 else ft.Colors.GREY_500
+                self.meter_texts[channel].value = f"{value:.2f}"
+            self.meter_panel.update()
 
     def show_snackbar(self, message: str, color: str = ft.Colors.GREEN_400):
         snackbar = ft.SnackBar(content=ft.Text(message), bgcolor=color)
@@ -710,44 +857,54 @@ class WebSocketOSCBridgeApp:
         snackbar.open = True
         self.page.update()  
 
-class _GuiLogHandler(logging.Handler):
-    """Python logging handler that forwards records to the Flet GUI log panel."""
+class _GuiLogHandler(log_pipeline.BatchingHandler):
+    """
+    ログ行をまとめて Flet GUI のログパネルへ渡すハンドラー (log_refresh_hz 回/秒まで)
+
+    ログパネルの内容は固定長のバッファ (log_capacity 行) に保持し、溢れた行は
+    log_file を設定した場合にローテーションするファイルへ書き出す。
+    """
     def __init__(self, app_ref):
-        super().__init__()
+        super().__init__(self._forward, level=logging.INFO)
         self.app_ref: 'WebSocketOSCBridgeApp' = app_ref
+        self.ring = log_pipeline.LogRing()
+        self.setFormatter(logging.Formatter('[%(asctime)s] %(message)s', datefmt="%H:%M:%S"))
 
-    def emit(self, record: logging.LogRecord):
-        """Forward log record to GUI thread safely."""
-        try:
-            msg = self.format(record)
-            if self.app_ref.page is not None:
-                try:
-                    # If called from non-UI thread, schedule on UI thread
-                    self.app_ref.page.call_from_thread(lambda: self.app_ref.log_message(msg))
-                except Exception:
-                    # Fallback: call directly (may already be on UI thread)
-                    self.app_ref.log_message(msg)
-            else:
-                # Page not ready yet; store or ignore (no GUI to show yet)
-                pass
-        except Exception:
-            # Ignore all errors to avoid disrupting logging flow
-            pass
+    def configure(self, config) -> None:
+        """設定の容量・更新レート・書き出し先を反映"""
+        self.interval = 1.0 / config.log_refresh_hz if config.log_refresh_hz > 0 else log_pipeline.GUI_FLUSH_INTERVAL
+        self.ring.configure(config.log_capacity, config.log_file,
+                            config.log_file_max_bytes, config.log_file_backups)
+
+    def _forward(self, lines):
+        """バッファに追加してまとめて表示 (ページ作成前はバッファのみ)"""
+        self.ring.extend(lines)
+        # ログパネルのコントロールはページのスレッドでだけ変更する
+        if self.app_ref.page is not None and self.app_ref.log_list is not None:
+            self.app_ref.page.run_thread(self.app_ref.log_lines, lines)
+
+    def close(self):
+        super().close()
+        self.ring.close()
 
 def main():
     """アプリケーション起動"""
-    # Set up standard logging for console
-    logging.basicConfig(level=logging.INFO,
-                        format='%(asctime)s - %(levelname)s - %(message)s')
-
     app = WebSocketOSCBridgeApp()
-    # Add GUI log handler so bridge logs appear in GUI
-    gui_handler = _GuiLogHandler(app)
-    gui_handler.setLevel(logging.INFO)
-    logging.getLogger().addHandler(gui_handler)
+    app.log_handler = _GuiLogHandler(app)
+    # コンソールとGUIのログパネルへ出力 (整形・出力はバックグラウンドスレッドで行う)
+    pipeline = log_pipeline.setup_logging(logging.INFO, [logging.StreamHandler(), app.log_handler])
 
-    # Using a less common port to avoid conflicts (e.g., OSC default UDP port 8000)
-    ft.app(target=app.main, view=ft.AppView.WEB_BROWSER, port=8550)
+    try:
+        # Using a less common port to avoid conflicts (e.g., OSC default UDP port 8000)
+        ft.app(target=app.main, view=ft.AppView.WEB_BROWSER, port=8550)
+    finally:
+        # 動作中のブリッジを停止 (出力中のチャンネルに0を送る)
+        if app.runtime:
+            app.runtime.shutdown()
+        # 保存待ちの設定を書き込む
+        if app.bridge:
+            app.bridge.config.flush(5.0)
+        pipeline.stop()
 
 if __name__ == "__main__":
     main()
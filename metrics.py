@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+メトリクスモジュール
+カウンターと固定バケットのヒストグラムを保持し、Prometheusのテキスト形式で出力する
+"""
+
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 処理時間用のバケット (秒): 1µs - 100ms
+TIME_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 1e-1,
+)
+# イベントループ遅延用のバケット (秒): 100µs - 1s
+LAG_BUCKETS = (1e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 1e-1, 2.5e-1, 5e-1, 1.0)
+
+
+class Counter:
+    """単調増加するカウンター"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    """
+    固定バケットのヒストグラム
+
+    記録はバケットの二分探索と加算のみ。バケットはナノ秒の整数でも保持し、
+    perf_counter_ns() の差分をそのまま記録できるようにする。
+    """
+
+    __slots__ = ("bounds", "_bounds_ns", "counts", "sum", "count", "max")
+
+    def __init__(self, bounds: Sequence[float] = TIME_BUCKETS):
+        self.bounds = tuple(bounds)
+        self._bounds_ns = tuple(int(bound * 1e9) for bound in self.bounds)
+        # 最後の要素は +Inf バケット
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """値 (秒) を記録"""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def observe_ns(self, value_ns: int) -> None:
+        """値 (ナノ秒) を記録"""
+        self.counts[bisect_left(self._bounds_ns, value_ns)] += 1
+        value = value_ns * 1e-9
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, 累積数) の一覧"""
+        result = []
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            result.append((format(bound, "g"), total))
+        result.append(("+Inf", total + self.counts[-1]))
+        return result
+
+
+class Metrics:
+    """
+    メトリクスレジストリ
+
+    counter() / histogram() で作成したメトリクスは呼び出し側が直接更新する。
+    既存の集計値 (int属性など) は counter_func() / gauge_func() で出力時に読み取る。
+    """
+
+    def __init__(self, prefix: str = "haptira"):
+        self.prefix = prefix
+        # name -> (type, help, Counter / Histogram / 読み取り関数)
+        self._metrics: Dict[str, Tuple[str, str, object]] = {}
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        """カウンターを作成 (同名のものがあればそれを返す)"""
+        return self._register(name, "counter", help_text, Counter)
+
+    def histogram(self, name: str, help_text: str, bounds: Sequence[float] = TIME_BUCKETS) -> Histogram:
+        """ヒストグラムを作成 (同名のものがあればそれを返す)"""
+        return self._register(name, "histogram", help_text, lambda: Histogram(bounds))
+
+    def counter_func(self, name: str, help_text: str, func: Callable[[], float]) -> None:
+        """出力時に func() の値を読み取るカウンターを登録"""
+        self._metrics[name] = ("counter", help_text, func)
+
+    def gauge_func(self, name: str, help_text: str, func: Callable[[], float]) -> None:
+        """出力時に func() の値を読み取るゲージを登録"""
+        self._metrics[name] = ("gauge", help_text, func)
+
+    def get(self, name: str):
+        """登録済みのメトリクスを取得"""
+        entry = self._metrics.get(name)
+        return entry[2] if entry else None
+
+    def _register(self, name: str, kind: str, help_text: str, factory):
+        entry = self._metrics.get(name)
+        if entry is not None and entry[0] == kind and not callable(entry[2]):
+            return entry[2]
+        metric = factory()
+        self._metrics[name] = (kind, help_text, metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheusのテキスト形式で出力"""
+        lines = []
+        for name, (kind, help_text, metric) in self._metrics.items():
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            if isinstance(metric, Histogram):
+                for le, count in metric.cumulative():
+                    lines.append(f'{full_name}_bucket{{le="{le}"}} {count}')
+                lines.append(f"{full_name}_sum {metric.sum!r}")
+                lines.append(f"{full_name}_count {metric.count}")
+            elif isinstance(metric, Counter):
+                lines.append(f"{full_name} {metric.value}")
+            else:
+                try:
+                    value = metric()
+                except Exception:
+                    continue
+                lines.append(f"{full_name} {value}")
+        lines.append("")
+        return "\n".join(lines)
@@ -4,24 +4,83 @@ OSCクライアントモジュール
 OSCメッセージを送信する機能を提供
 """
 
+import asyncio
 import logging
+import socket
+import struct
+from collections import deque
 from pythonosc import udp_client
-from pythonosc.osc_message_builder import OscMessageBuilder
-from typing import Optional
+from typing import Deque, Dict, List, Optional
+from channel_state import CHANNEL_COUNT, iter_channels
+
+# OSCアドレス形式: /avatar/parameters/haptira/channel/XX/value
+DEFAULT_ADDRESS_FORMAT = "/avatar/parameters/haptira/channel/{channel:02d}/value"
+
+# バンドルヘッダー: "#bundle" + タイムタグ(即時 = 1)
+_BUNDLE_HEADER = b"#bundle\0" + struct.pack(">Q", 1)
+_FLOAT_TYPE_TAG = b",f\0\0"
+_FLOAT = struct.Struct(">f")
+_INT32 = struct.Struct(">i")
+
+
+def _osc_string(value: str) -> bytes:
+    """OSC文字列 (NUL終端 + 4バイト境界パディング) にエンコード"""
+    data = value.encode("utf-8") + b"\0"
+    return data + b"\0" * (-len(data) % 4)
+
+
+class OSCMessageTemplate:
+    """
+    エンコード済みOSCメッセージのテンプレート
+    
+    アドレスと型タグは生成時に一度だけエンコードし、送信時は末尾の
+    float32 (4バイト, ビッグエンディアン) だけを書き換える。
+    UDPClient.send() は dgram 属性しか参照しないのでそのまま渡せる。
+    """
+    
+    __slots__ = ("address", "dgram", "size_prefix", "_value_offset")
+    
+    def __init__(self, address: str):
+        self.address = address
+        header = _osc_string(address) + _FLOAT_TYPE_TAG
+        self._value_offset = len(header)
+        self.dgram = bytearray(header + bytes(4))
+        # バンドル要素として埋め込む際のサイズプレフィックス
+        self.size_prefix = _INT32.pack(len(self.dgram))
+    
+    def set_value(self, value: float) -> None:
+        """float32値をバッファに直接書き込む"""
+        _FLOAT.pack_into(self.dgram, self._value_offset, value)
+
+
+class _EncodedBundle:
+    """エンコード済みOSCバンドル (UDPClient.send() 用)"""
+    
+    __slots__ = ("dgram",)
+    
+    def __init__(self, dgram: bytes):
+        self.dgram = dgram
+
 
 class OSCClient:
     """OSCクライアントクラス"""
     
-    def __init__(self, ip: str = "127.0.0.1", port: int = 8000):
+    def __init__(self, ip: str = "127.0.0.1", port: int = 8000, use_bundle: bool = False,
+                 address_format: str = DEFAULT_ADDRESS_FORMAT):
         self.ip = ip
         self.port = port
+        # True の場合、複数チャンネルを1つのOSCバンドル(1データグラム)にまとめて送信
+        self.use_bundle = use_bundle
+        self.address_format = address_format
         self.client: Optional[udp_client.SimpleUDPClient] = None
+        self.templates: Dict[int, OSCMessageTemplate] = {}
         self.connect()
     
     def connect(self) -> bool:
         """OSCクライアントに接続"""
         try:
             self.client = udp_client.SimpleUDPClient(self.ip, self.port)
+            self._build_templates()
             logging.info(f"OSCクライアント接続: {self.ip}:{self.port}")
             return True
         except Exception as e:
@@ -32,6 +91,7 @@ class OSCClient:
     def disconnect(self) -> None:
         """OSCクライアントを切断"""
         if self.client:
+            self.client.close()
             self.client = None
             logging.info("OSCクライアント切断")
     
@@ -42,6 +102,46 @@ class OSCClient:
         self.disconnect()
         return self.connect()
     
+    def set_address_format(self, address_format: str) -> None:
+        """
+        OSCアドレス形式を変更してテンプレートを再構築
+        
+        Args:
+            address_format: "{channel:02d}" を含むアドレス形式
+        """
+        self.address_format = address_format
+        self._build_templates()
+        logging.info(f"OSCアドレス形式を変更: {address_format}")
+    
+    def _build_templates(self) -> None:
+        """全チャンネル分のエンコード済みメッセージを構築"""
+        self.templates = {
+            channel: OSCMessageTemplate(self.address_format.format(channel=channel))
+            for channel in range(CHANNEL_COUNT)
+        }
+    
+    def set_bundle_mode(self, enabled: bool) -> None:
+        """バンドル送信モードを切り替え
+
+        バンドルを解釈できない受信側の場合は False にして個別メッセージ送信に戻す
+        """
+        self.use_bundle = enabled
+        logging.info(f"OSCバンドル送信: {'有効' if enabled else '無効'}")
+    
+    def _prepare_message(self, channel: int, value: float) -> Optional[OSCMessageTemplate]:
+        """チャンネルのテンプレートに値を書き込む (無効なチャンネルはNone)"""
+        template = self.templates.get(channel)
+        if template is None:
+            logging.error(f"無効なチャンネル番号: {channel}")
+            return None
+        
+        if not (0.0 <= value <= 1.0):
+            logging.warning(f"値を0.0-1.0の範囲にクランプ: {value}")
+            value = max(0.0, min(1.0, value))
+        
+        template.set_value(value)
+        return template
+    
     def send_haptic_value(self, channel: int, value: float) -> bool:
         """
         ハプティック値をOSCで送信
@@ -57,22 +157,14 @@ class OSCClient:
             logging.warning("OSCクライアントが接続されていません")
             return False
         
-        if not (0 <= channel <= 15):
-            logging.error(f"無効なチャンネル番号: {channel}")
-            return False
-        
-        if not (0.0 <= value <= 1.0):
-            logging.warning(f"値を0.0-1.0の範囲にクランプ: {value}")
-            value = max(0.0, min(1.0, value))
-        
         try:
-            # OSCアドレス形式: /avatar/parameters/haptira/channel/XX/value
-            channel_str = f"{channel:02d}"  # 2桁ゼロパディング
-            osc_address = f"/avatar/parameters/haptira/channel/{channel_str}/value"
+            message = self._prepare_message(channel, value)
+            if message is None:
+                return False
             
-            # float32値として送信
-            self.client.send_message(osc_address, value)
-            logging.debug(f"OSC送信: {osc_address} = {value}")
+            self.client.send(message)
+            if logging.root.isEnabledFor(logging.DEBUG):
+                logging.debug(f"OSC送信: {message.address} = {value}")
             return True
             
         except Exception as e:
@@ -89,9 +181,62 @@ class OSCClient:
         Returns:
             すべて送信成功の場合True
         """
+        return self._send_channels(list(channel_values), channel_values)
+    
+    def send_masked_values(self, mask: int, values) -> bool:
+        """
+        ビットマスクで指定したチャンネルの値を一括送信
+        
+        Args:
+            mask: 送信するチャンネルのビットマスク
+            values: チャンネル番号で値を引ける配列 (ChannelState.values など)
+        
+        Returns:
+            すべて送信成功の場合True
+        """
+        return self._send_channels(list(iter_channels(mask)), values)
+    
+    def _send_channels(self, channels: List[int], values) -> bool:
+        """channels の各チャンネルについて values[channel] を送信"""
+        if self.use_bundle and len(channels) > 1:
+            return self._send_bundle(channels, values)
+        
+        success = True
+        for channel in channels:
+            if not self.send_haptic_value(channel, values[channel]):
+                success = False
+        return success
+    
+    def _send_bundle(self, channels: List[int], values) -> bool:
+        """
+        複数チャンネルを1つのOSCバンドル(タイムタグ: 即時)として送信
+        
+        バンドル送信に失敗した場合は個別メッセージ送信にフォールバックする
+        """
+        if not self.client:
+            logging.warning("OSCクライアントが接続されていません")
+            return False
+        
         success = True
-        for channel, value in channel_values.items():
-            if not self.send_haptic_value(channel, value):
+        parts = [_BUNDLE_HEADER]
+        for channel in channels:
+            message = self._prepare_message(channel, values[channel])
+            if message is None:
+                success = False
+                continue
+            parts.append(message.size_prefix)
+            parts.append(message.dgram)
+        
+        try:
+            self.client.send(_EncodedBundle(b"".join(parts)))
+            if logging.root.isEnabledFor(logging.DEBUG):
+                logging.debug(f"OSCバンドル送信: {[(channel, values[channel]) for channel in channels]}")
+            return success
+        except Exception as e:
+            logging.warning(f"OSCバンドル送信エラー、個別送信にフォールバックします: {e}")
+        
+        for channel in channels:
+            if not self.send_haptic_value(channel, values[channel]):
                 success = False
         return success
     
@@ -99,6 +244,172 @@ class OSCClient:
         """接続状態を確認"""
         return self.client is not None
 
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+
+class _OSCDatagramProtocol(asyncio.DatagramProtocol):
+    """AsyncUDPSender 用のデータグラムプロトコル (フロー制御を通知)"""
+    
+    def __init__(self, sender: "AsyncUDPSender"):
+        self.sender = sender
+    
+    def pause_writing(self) -> None:
+        self.sender.paused = True
+    
+    def resume_writing(self) -> None:
+        self.sender.paused = False
+        self.sender.flush()
+    
+    def error_received(self, exc: Exception) -> None:
+        logging.warning(f"OSC送信エラー(非同期): {exc}")
+    
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.sender.transport = None
+
+
+class AsyncUDPSender:
+    """
+    非ブロッキングUDP送信 (UDPClient.send() 互換)
+    
+    イベントループに接続後は asyncio のデータグラムトランスポート経由で送信し、
+    ソケットバッファが詰まった場合は上限付きキューに退避する。
+    キューが満杯の場合は drop_policy に従って破棄する。
+    """
+    
+    def __init__(self, ip: str, port: int, queue_size: int = 256, drop_policy: str = DROP_OLDEST):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"無効なドロップポリシー: {drop_policy}")
+        family, socktype, proto, _, sockaddr = socket.getaddrinfo(ip, port, type=socket.SOCK_DGRAM)[0]
+        self.sock = socket.socket(family, socktype, proto)
+        self.sock.setblocking(False)
+        self.sock.connect(sockaddr)
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.queue: Deque[bytes] = deque()
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.paused = False
+        self.dropped = 0
+        self._attaching = False
+    
+    async def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """イベントループのデータグラムトランスポートに接続 (接続済み・接続中の場合は何もしない)"""
+        if self.transport is not None or self._attaching or self.sock.fileno() < 0:
+            return
+        self._attaching = True
+        try:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _OSCDatagramProtocol(self), sock=self.sock
+            )
+        finally:
+            self._attaching = False
+        self.transport = transport
+        self.flush()
+    
+    def send(self, content) -> None:
+        """データグラムを送信 (ブロックしない)"""
+        if self.transport is not None:
+            if not self.paused and not self.queue:
+                # uvloop のトランスポートは送信できなかったデータをコピーせずに参照したまま保持するため、
+                # 再利用されるテンプレートのバッファではなくコピーを渡す
+                self.transport.sendto(bytes(content.dgram))
+                return
+        elif not self.queue:
+            # ループ接続前 (ブリッジ停止中のテスト送信など) はソケットへ直接送信
+            try:
+                self.sock.send(content.dgram)
+                return
+            except BlockingIOError:
+                pass
+        # テンプレートのバッファは再利用されるためコピーしてからキューに積む
+        self._enqueue(bytes(content.dgram))
+    
+    def _enqueue(self, data: bytes) -> None:
+        """上限付きキューに追加 (満杯時はドロップポリシーに従う)"""
+        if len(self.queue) >= self.queue_size:
+            self.dropped += 1
+            if self.drop_policy == DROP_NEWEST:
+                return
+            self.queue.popleft()
+        self.queue.append(data)
+    
+    def flush(self) -> None:
+        """キューに溜まったデータグラムを送信"""
+        while self.queue and self.transport is not None and not self.paused:
+            self.transport.sendto(self.queue.popleft())
+    
+    def close(self) -> None:
+        """トランスポートとソケットを閉じる"""
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        else:
+            self.sock.close()
+        self.queue.clear()
+
+
+class AsyncOSCClient(OSCClient):
+    """
+    asyncio データグラムトランスポートを使う非同期OSCクライアント
+    
+    OSCClient と同じインターフェースを持ち、ブリッジの osc_client として
+    そのまま置き換えられる。送信はイベントループをブロックしない。
+    """
+    
+    def __init__(self, ip: str = "127.0.0.1", port: int = 8000, use_bundle: bool = False,
+                 address_format: str = DEFAULT_ADDRESS_FORMAT,
+                 queue_size: int = 256, drop_policy: str = DROP_OLDEST):
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.dropped_count = 0
+        super().__init__(ip, port, use_bundle, address_format)
+    
+    def connect(self) -> bool:
+        """非ブロッキングUDPソケットを作成"""
+        try:
+            self.client = AsyncUDPSender(self.ip, self.port, self.queue_size, self.drop_policy)
+            self._build_templates()
+            logging.info(f"OSCクライアント接続(非同期): {self.ip}:{self.port}")
+            return True
+        except Exception as e:
+            logging.error(f"OSCクライアント接続エラー: {e}")
+            self.client = None
+            return False
+    
+    def disconnect(self) -> None:
+        """OSCクライアントを切断"""
+        if self.client:
+            self.dropped_count += self.client.dropped
+        super().disconnect()
+        # 次の start() で接続したループに改めて接続する
+        self.loop = None
+    
+    def update_target(self, ip: str, port: int) -> bool:
+        """送信先を更新 (ループ動作中はループ側で新しいソケットのトランスポートを張り直す)"""
+        loop = self.loop
+        success = super().update_target(ip, port)
+        if success and loop is not None and loop.is_running():
+            self.loop = loop
+            loop.call_soon_threadsafe(self._attach_current)
+        return success
+    
+    async def start(self) -> None:
+        """実行中のイベントループにトランスポートを接続"""
+        self.loop = asyncio.get_running_loop()
+        if self.client:
+            await self.client.attach(self.loop)
+    
+    def _attach_current(self) -> None:
+        """現在のソケットのトランスポート接続をスケジュール (ループスレッドで実行)"""
+        if self.client and self.loop is not None:
+            self.loop.create_task(self.client.attach(self.loop))
+    
+    def get_dropped_count(self) -> int:
+        """キュー溢れで破棄したデータグラム数"""
+        return self.dropped_count + (self.client.dropped if self.client else 0)
+
 if __name__ == "__main__":
     # テスト用コード
     logging.basicConfig(level=logging.DEBUG)
@@ -121,9 +432,24 @@ if __name__ == "__main__":
         test_values = {0: 0.1, 1: 0.3, 3: 0.7}
         osc_client.send_multiple_values(test_values)
         
+        # バンドル送信テスト
+        osc_client.set_bundle_mode(True)
+        osc_client.send_multiple_values(test_values)
+        
         print("✓ テスト送信完了")
     else:
         print("✗ OSCクライアント接続失敗")
     
     osc_client.disconnect()
+    
+    # 非同期クライアントテスト
+    async def async_test():
+        async_client = AsyncOSCClient("127.0.0.1", 8000)
+        await async_client.start()
+        async_client.send_multiple_values({0: 0.1, 1: 0.3, 3: 0.7})
+        await asyncio.sleep(0.1)
+        async_client.disconnect()
+        print("✓ 非同期テスト送信完了")
+    
+    asyncio.run(async_test())
 
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+レート制限モジュール
+WebSocketクライアントごとの受信フレーム数・バイト数をトークンバケットで制限する
+"""
+
+import time
+from typing import Optional
+
+RATE_LIMIT_DROP = "drop"          # 上限を超えたフレームを破棄
+RATE_LIMIT_THROTTLE = "throttle"  # トークンが貯まるまでそのクライアントの受信を待たせる
+RATE_LIMIT_ACTIONS = (RATE_LIMIT_DROP, RATE_LIMIT_THROTTLE)
+
+
+class TokenBucket:
+    """
+    トークンバケット
+
+    rate (個/秒) でトークンが貯まり、最大 burst 個まで保持する。
+    burst を超える要求は burst 個として扱う (満杯になれば通るようにする)
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_consume(self, amount: float, now: float) -> bool:
+        """トークンが足りれば消費して True"""
+        self._refill(now)
+        amount = min(amount, self.burst)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        トークンを先取りで消費し、不足分が貯まるまでの待ち時間 (秒) を返す
+
+        不足している場合、トークンは負になり後続の要求はその分だけ長く待つ
+        """
+        self._refill(now)
+        self.tokens -= min(amount, self.burst)
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class ClientRateLimiter:
+    """
+    クライアントごとのレート制限
+
+    フレーム数/秒とバイト数/秒のトークンバケットを持ち、どちらかが 0 の場合はその制限を行わない。
+    バーストとして burst_seconds 秒分の上限まで一度に受け付ける。
+    """
+
+    __slots__ = ("frames", "bytes")
+
+    def __init__(self, max_fps: float, max_bytes_per_sec: float, burst_seconds: float = 1.0):
+        now = time.monotonic()
+        self.frames: Optional[TokenBucket] = None
+        self.bytes: Optional[TokenBucket] = None
+        if max_fps > 0:
+            self.frames = TokenBucket(max_fps, max(1.0, max_fps * burst_seconds), now)
+        if max_bytes_per_sec > 0:
+            self.bytes = TokenBucket(max_bytes_per_sec, max_bytes_per_sec * burst_seconds, now)
+
+    @property
+    def enabled(self) -> bool:
+        return self.frames is not None or self.bytes is not None
+
+    def try_acquire(self, size: int) -> bool:
+        """フレームを受け付けられれば True (drop 用)"""
+        now = time.monotonic()
+        if self.frames is not None and not self.frames.try_consume(1, now):
+            return False
+        if self.bytes is not None and not self.bytes.try_consume(size, now):
+            # フレーム数の方は消費済みだが、破棄するフレームの分なので戻す
+            if self.frames is not None:
+                self.frames.tokens += 1
+            return False
+        return True
+
+    def reserve(self, size: int) -> float:
+        """フレームを受け付けるまでの待ち時間 (秒) を返す (throttle 用)"""
+        now = time.monotonic()
+        wait = 0.0
+        if self.frames is not None:
+            wait = self.frames.reserve(1, now)
+        if self.bytes is not None:
+            wait = max(wait, self.bytes.reserve(size, now))
+        return wait
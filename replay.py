@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+受信トラフィックの再生ツール
+traffic_log で記録したファイルのフレームを、記録時のクライアントごとの接続で
+WebSocketブリッジに送り直す
+
+使い方:
+    # 動作中のブリッジへ記録時の速度で再生
+    python replay.py capture.htrc --url ws://localhost:3031
+    # 設定ファイルでブリッジをこのプロセス内に起動して4倍速で再生
+    python replay.py capture.htrc --config config.json --speed 4
+    # 待ち時間なしで再生 / 記録内容の概要のみ表示
+    python replay.py capture.htrc --speed 0
+    python replay.py capture.htrc --info
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import sys
+import time
+from typing import Dict
+
+import websockets
+
+from traffic_log import RECORD_BINARY, RECORD_CONNECT, RECORD_DISCONNECT, RECORD_TEXT, CaptureReader
+
+DEFAULT_URL = "ws://localhost:3031"
+DEFAULT_PATH = "/haptic"
+
+
+def summarize(path: str) -> dict:
+    """記録ファイルの概要 (レコード数・時間・クライアント数)"""
+    frames = 0
+    frame_bytes = 0
+    clients = set()
+    last_offset = 0
+    with CaptureReader(path) as reader:
+        started = reader.started
+        for record in reader:
+            last_offset = record.offset_ns
+            clients.add(record.client_id)
+            if record.kind in (RECORD_TEXT, RECORD_BINARY):
+                frames += 1
+                frame_bytes += len(record.payload)
+    return {
+        'file': path,
+        'started': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)),
+        'duration_seconds': round(last_offset / 1e9, 3),
+        'frames': frames,
+        'frame_bytes': frame_bytes,
+        'clients': len(clients),
+    }
+
+
+async def replay(path: str, url: str, speed: float = 1.0) -> dict:
+    """
+    記録ファイルを再生
+
+    Args:
+        path: 記録ファイル
+        url: 送信先のベースURL (ws://host:port)。接続ごとのパスは記録時のものを使う
+        speed: 再生速度の倍率 (0 で待ち時間なし)
+    """
+    loop = asyncio.get_running_loop()
+    connections: Dict[int, websockets.ClientConnection] = {}
+    sent = 0
+    errors = 0
+    base_url = url.rstrip("/")
+
+    async def connect(client_id: int, request_path: str):
+        connection = await websockets.connect(base_url + (request_path or DEFAULT_PATH))
+        connections[client_id] = connection
+        return connection
+
+    start = loop.time()
+    try:
+        with CaptureReader(path) as reader:
+            for record in reader:
+                if speed > 0:
+                    delay = start + record.offset_ns / 1e9 / speed - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                try:
+                    if record.kind == RECORD_CONNECT:
+                        await connect(record.client_id, record.payload.decode('utf-8'))
+                    elif record.kind == RECORD_DISCONNECT:
+                        connection = connections.pop(record.client_id, None)
+                        if connection is not None:
+                            await connection.close()
+                    else:
+                        connection = connections.get(record.client_id)
+                        if connection is None:
+                            # 記録開始前から接続していたクライアント
+                            connection = await connect(record.client_id, DEFAULT_PATH)
+                        if record.kind == RECORD_TEXT:
+                            await connection.send(record.payload.decode('utf-8'))
+                        else:
+                            await connection.send(record.payload)
+                        sent += 1
+                except (OSError, websockets.exceptions.WebSocketException) as e:
+                    errors += 1
+                    logging.warning(f"再生エラー (クライアント {record.client_id}): {e}")
+    finally:
+        for connection in connections.values():
+            await connection.close()
+    elapsed = loop.time() - start
+    return {
+        'frames_sent': sent,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'frames_per_sec': round(sent / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+async def replay_with_bridge(path: str, config_file: str, speed: float, settle: float) -> dict:
+    """ブリッジをこのプロセス内に起動して再生し、再生後のブリッジの状態も返す"""
+    from bridge import WebSocketOSCBridge
+
+    # 設定読み込みのメッセージでJSON出力が乱れないよう標準エラーへ
+    with contextlib.redirect_stdout(sys.stderr):
+        bridge = WebSocketOSCBridge(config_file)
+    # 再生したトラフィックを記録し直さない
+    bridge.config.capture_file = ""
+    task = asyncio.create_task(bridge.start())
+    while not bridge.websocket_server.is_running:
+        if task.done():
+            raise RuntimeError("ブリッジを起動できませんでした")
+        await asyncio.sleep(0.01)
+    try:
+        result = await replay(path, f"ws://127.0.0.1:{bridge.config.websocket_port}", speed)
+        await asyncio.sleep(settle)
+        status = bridge.get_status()
+        result['bridge'] = {key: status[key] for key in (
+            'frames_received', 'coalesced_frames', 'osc_sends', 'osc_send_errors', 'latency')}
+    finally:
+        await bridge.stop()
+        await task
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="受信トラフィックの再生")
+    parser.add_argument('file', help="記録ファイル")
+    parser.add_argument('--url', default=DEFAULT_URL, help="送信先のブリッジ (ws://host:port)")
+    parser.add_argument('--config', help="このプロセス内でブリッジを起動する設定ファイル (--url より優先)")
+    parser.add_argument('--speed', type=float, default=1.0, help="再生速度の倍率 (0で待ち時間なし)")
+    parser.add_argument('--settle', type=float, default=0.5, help="--config 使用時、再生後に状態を取得するまでの待ち時間 (秒)")
+    parser.add_argument('--info', action='store_true', help="記録内容の概要のみ表示")
+    parser.add_argument('--log-level', default="WARNING", help="ログレベル")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.WARNING),
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        if args.info:
+            result = summarize(args.file)
+        elif args.config:
+            result = asyncio.run(replay_with_bridge(args.file, args.config, args.speed, args.settle))
+        else:
+            result = asyncio.run(replay(args.file, args.url, args.speed))
+    except (OSError, ValueError) as e:
+        logging.error(f"再生できませんでした: {e}")
+        sys.exit(1)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+ブリッジ実行スレッドモジュール
+ブリッジ専用のスレッドとイベントループを1つだけ作って持ち続け、GUIなど他のスレッドからの
+コマンド (開始・停止・テスト送信・設定変更) をキューで受け取って順に実行する
+"""
+
+import asyncio
+import inspect
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import event_loop
+from bridge import WebSocketOSCBridge
+from channel_state import iter_channels
+
+# コマンドの結果を受け取るコールバック (result, error)。dispatch 未指定の場合はブリッジのスレッドから呼び出す
+CommandCallback = Callable[[Any, Optional[BaseException]], None]
+
+# 停止コマンドでWebSocketサーバーの終了を待つ時間 (秒)
+STOP_TIMEOUT = 10.0
+
+_SHUTDOWN = object()
+
+
+class BridgeRuntime:
+    """
+    ブリッジ実行スレッドクラス
+
+    コマンドは呼び出し元をブロックせずにキューへ入れ、ブリッジのスレッドで受け付けた順に
+    1つずつ実行する。結果 (または例外) はコマンドごとのコールバックで受け取る。
+    ブリッジを停止してもスレッドとイベントループは残り、次の開始で再利用する。
+    """
+
+    def __init__(self, bridge: WebSocketOSCBridge, loop_name: str = event_loop.EVENT_LOOP_AUTO,
+                 dispatch: Optional[Callable[..., None]] = None):
+        self.bridge = bridge
+        # コールバックを別スレッドで呼び出す関数 dispatch(func, *args) (None の場合はブリッジのスレッドで呼び出す)
+        self.dispatch = dispatch
+        self.loop = event_loop.new_event_loop(loop_name)
+        self._commands: asyncio.Queue = asyncio.Queue()
+        self._server_task: Optional[asyncio.Task] = None
+        self._test_zero_handle: Optional[asyncio.TimerHandle] = None
+        self._thread = threading.Thread(target=self._run, name="bridge-runtime", daemon=True)
+        self._thread.start()
+
+    @property
+    def is_bridge_running(self) -> bool:
+        """WebSocketサーバーが動作中か"""
+        return self._server_task is not None and not self._server_task.done()
+
+    def submit(self, func: Callable, *args, callback: Optional[CommandCallback] = None) -> None:
+        """
+        コマンドをキューに追加 (ブロックしない)
+
+        Args:
+            func: ブリッジのスレッドで実行する関数またはコルーチン関数
+            callback: 実行後に (戻り値, 例外) で呼び出す関数
+        """
+        try:
+            self.loop.call_soon_threadsafe(self._commands.put_nowait, (func, args, callback))
+        except RuntimeError as e:
+            # 終了済み (イベントループが閉じている)
+            self._notify(callback, None, e)
+
+    def start_bridge(self, callback: Optional[CommandCallback] = None) -> None:
+        """ブリッジを開始 (WebSocketサーバーの待ち受け開始後に True で完了)"""
+        self.submit(self._start_bridge, callback=callback)
+
+    def stop_bridge(self, callback: Optional[CommandCallback] = None) -> None:
+        """ブリッジを停止 (停止していた場合は False で完了)"""
+        self.submit(self._stop_bridge, callback=callback)
+
+    def test_send(self, data: Dict[str, float], callback: Optional[CommandCallback] = None) -> None:
+        """テスト送信 (受信したメッセージと同じく処理する)"""
+        self.submit(self._test_send, data, callback=callback)
+
+    def reconfigure(self, func: Callable, *args, callback: Optional[CommandCallback] = None) -> None:
+        """ブリッジの設定変更をブリッジのスレッドで実行"""
+        self.submit(func, *args, callback=callback)
+
+    def shutdown(self, timeout: float = STOP_TIMEOUT) -> None:
+        """ブリッジを停止してスレッドを終了 (終了を待つ)"""
+        if not self._thread.is_alive():
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._commands.put_nowait, _SHUTDOWN)
+        except RuntimeError:
+            return
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._process_commands())
+        finally:
+            self.loop.close()
+
+    async def _process_commands(self) -> None:
+        while True:
+            command = await self._commands.get()
+            if command is _SHUTDOWN:
+                break
+            func, args, callback = command
+            try:
+                result = func(*args)
+                if inspect.isawaitable(result):
+                    result = await result
+            except Exception as e:
+                self._notify(callback, None, e)
+            else:
+                self._notify(callback, result, None)
+        await self._stop_bridge()
+
+    def _notify(self, callback: Optional[CommandCallback], result: Any, error: Optional[BaseException]) -> None:
+        if callback is None:
+            if error is not None:
+                logging.error(f"ブリッジコマンドエラー: {error}")
+            return
+        if self.dispatch is None:
+            self._invoke(callback, result, error)
+            return
+        try:
+            self.dispatch(self._invoke, callback, result, error)
+        except Exception as e:
+            # 受け渡し先 (ページ) が終了している
+            logging.warning(f"ブリッジコマンドの結果を通知できませんでした: {e}")
+
+    @staticmethod
+    def _invoke(callback: CommandCallback, result: Any, error: Optional[BaseException]) -> None:
+        try:
+            callback(result, error)
+        except Exception as e:
+            logging.error(f"ブリッジコマンドのコールバックエラー: {e}")
+
+    async def _start_bridge(self) -> bool:
+        if self.is_bridge_running:
+            return True
+        self._cancel_test_zero()
+        self._server_task = asyncio.create_task(self.bridge.start())
+        while not self.bridge.websocket_server.is_running:
+            if self._server_task.done():
+                # WebSocketサーバーを開始できなかった (エラーはサーバー側でログ出力済み)
+                self._server_task = None
+                await self.bridge.stop()
+                raise RuntimeError("WebSocketサーバーを開始できませんでした")
+            await asyncio.sleep(0.01)
+        return True
+
+    async def _stop_bridge(self) -> bool:
+        task = self._server_task
+        if task is None:
+            return False
+        self._server_task = None
+        await self.bridge.stop()
+        try:
+            await asyncio.wait_for(task, timeout=STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.warning("WebSocketサーバーの終了待ちがタイムアウトしました")
+        except Exception as e:
+            logging.error(f"WebSocketサーバーエラー: {e}")
+        return True
+
+    async def _test_send(self, data: Dict[str, float]) -> None:
+        await self.bridge.handle_websocket_message(data)
+        if not self.bridge.is_running:
+            # 停止中はタイムアウト監視が動かないため、タイムアウト後に0を送る
+            self._cancel_test_zero()
+            self._test_zero_handle = self.loop.call_later(self.bridge.timeout_seconds, self._send_test_zeros)
+
+    def _send_test_zeros(self) -> None:
+        self._test_zero_handle = None
+        if self.bridge.is_running:
+            return
+        mask = 0
+        for channel in self.bridge.config.tag_channel_map.values():
+            mask |= 1 << channel
+        if not mask:
+            return
+        self.bridge.channel_state.zero(mask)
+        # 抑制フィルターの送信済み値も0に揃える
+        self.bridge._send_mask(mask, force=True)
+        logging.info(f"(テスト送信) タイムアウトで0を送信: {list(iter_channels(mask))}")
+
+    def _cancel_test_zero(self) -> None:
+        if self._test_zero_handle is not None:
+            self._test_zero_handle.cancel()
+            self._test_zero_handle = None
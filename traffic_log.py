@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+受信トラフィックの記録モジュール
+WebSocketで受信したフレームをタイムスタンプ・クライアントID付きでバイナリログに記録し、
+mmap で読み出す
+
+ファイル形式 (ビッグエンディアン):
+    ヘッダー (16バイト)
+        magic   4s  b"HTRC"
+        version B   LOG_VERSION
+        (予約)  3x
+        started d   記録開始時刻 (UNIX時間, 秒)
+    レコード (17バイト + ペイロード) の繰り返し
+        offset  Q   記録開始からの経過時間 (ナノ秒, 単調増加)
+        client  I   クライアントID (接続ごとの連番)
+        kind    B   RECORD_TEXT / RECORD_BINARY / RECORD_CONNECT / RECORD_DISCONNECT
+        length  I   ペイロードのバイト数
+        payload     テキストフレームはUTF-8、接続はリクエストパス、切断は空
+"""
+
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from typing import Iterator, NamedTuple, Optional
+
+LOG_MAGIC = b"HTRC"
+LOG_VERSION = 2
+FILE_HEADER = struct.Struct(">4sB3xd")
+RECORD_HEADER = struct.Struct(">QIBI")
+
+RECORD_TEXT = 1
+RECORD_BINARY = 2
+RECORD_CONNECT = 3
+RECORD_DISCONNECT = 4
+
+# 書き込み待ちの上限 (超えた分は破棄してループを止めない)
+CAPTURE_QUEUE_SIZE = 65536
+
+_STOP = object()
+
+
+class CaptureRecord(NamedTuple):
+    offset_ns: int
+    client_id: int
+    kind: int
+    payload: bytes
+
+
+class CaptureWriter:
+    """
+    受信トラフィックの記録クラス
+
+    record() は時刻を付けてキューに入れるだけで、エンコードとファイル書き込みは
+    バックグラウンドスレッドで行う。キューが満杯の場合は破棄して dropped に計上する。
+    """
+
+    def __init__(self, path: str, queue_size: int = CAPTURE_QUEUE_SIZE):
+        self.path = path
+        self.records = 0
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._file = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_ns = 0
+
+    def start(self) -> None:
+        """ファイルを作成して書き込みスレッドを開始"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'wb')
+        self._file.write(FILE_HEADER.pack(LOG_MAGIC, LOG_VERSION, time.time()))
+        self._start_ns = time.perf_counter_ns()
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+        logging.info(f"受信トラフィックの記録を開始しました: {self.path}")
+
+    def record(self, client_id: int, kind: int, payload=b"") -> None:
+        """レコードを追加 (イベントループから呼び出す)"""
+        try:
+            self._queue.put_nowait((time.perf_counter_ns() - self._start_ns, client_id, kind, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def record_frame(self, client_id: int, message) -> None:
+        """受信フレームを追加"""
+        self.record(client_id, RECORD_TEXT if isinstance(message, str) else RECORD_BINARY, message)
+
+    def close(self) -> None:
+        """残りのレコードを書き込んで終了"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        logging.info(f"受信トラフィックの記録を終了しました: {self.path} ({self.records}件, 破棄 {self.dropped}件)")
+
+    def _run(self) -> None:
+        pack = RECORD_HEADER.pack
+        write = self._file.write
+        get = self._queue.get
+        get_nowait = self._queue.get_nowait
+        try:
+            while True:
+                item = get()
+                # 溜まっている分をまとめて書き込んでから flush
+                while item is not _STOP:
+                    offset_ns, client_id, kind, payload = item
+                    if isinstance(payload, str):
+                        payload = payload.encode('utf-8')
+                    write(pack(offset_ns, client_id, kind, len(payload)))
+                    write(payload)
+                    self.records += 1
+                    try:
+                        item = get_nowait()
+                    except queue.Empty:
+                        break
+                self._file.flush()
+                if item is _STOP:
+                    return
+        except Exception as e:
+            logging.error(f"受信トラフィックの書き込みエラー: {e}")
+        finally:
+            self._file.close()
+
+
+class CaptureReader:
+    """
+    記録ファイルの読み出しクラス
+
+    mmap で開き、レコードを先頭から順に読み出すため、長時間の記録でも
+    ファイル全体をメモリに読み込まない。途中で切れた最後のレコードは無視する。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < FILE_HEADER.size:
+            self._file.close()
+            raise ValueError(f"記録ファイルではありません: {path}")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.started = FILE_HEADER.unpack_from(self._mmap, 0)
+        if magic != LOG_MAGIC or version != LOG_VERSION:
+            self.close()
+            raise ValueError(f"記録ファイルの形式が不正です: {path}")
+
+    def __iter__(self) -> Iterator[CaptureRecord]:
+        data = self._mmap
+        size = len(data)
+        unpack_from = RECORD_HEADER.unpack_from
+        header_size = RECORD_HEADER.size
+        offset = FILE_HEADER.size
+        while offset + header_size <= size:
+            offset_ns, client_id, kind, length = unpack_from(data, offset)
+            start = offset + header_size
+            end = start + length
+            if end > size:
+                break
+            yield CaptureRecord(offset_ns, client_id, kind, data[start:end])
+            offset = end
+
+    def close(self) -> None:
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -6,10 +6,91 @@ buttplug-lite互換のWebSocketサーバーを提供
 
 import asyncio
 import logging
+import struct
+import time
 import websockets
+from array import array
+from http import HTTPStatus
 from websockets.server import WebSocketServerProtocol
-from typing import Set, Callable, Optional
+from typing import Dict, Set, Callable, Optional
 import re
+from urllib.parse import parse_qs, urlsplit
+from channel_state import CHANNEL_COUNT, iter_channels
+from latency import LatencyTracker
+from metrics import METRICS_CONTENT_TYPE, Histogram, Metrics
+from rate_limiter import RATE_LIMIT_DROP, RATE_LIMIT_THROTTLE, ClientRateLimiter
+from traffic_log import RECORD_CONNECT, RECORD_DISCONNECT, CaptureWriter
+
+# 不正な入力の警告ログを出す最小間隔 (秒)
+INVALID_LOG_INTERVAL = 5.0
+# メトリクスを返すHTTPパス (WebSocketと同じポート)
+METRICS_PATH = "/metrics"
+# タグ解決キャッシュの上限 (不正なタグを大量に送るクライアント対策)
+TAG_CACHE_LIMIT = 1024
+
+_UNRESOLVED = object()
+
+# バイナリフレーム形式
+#   byte 0   : 値の形式 (BINARY_UINT8 / BINARY_UINT16 / BINARY_FLOAT32)
+#   byte 1-2 : チャンネルのビットマスク (uint16, ビッグエンディアン, bit N = チャンネル N)
+#   byte 3-  : マスクで立っているチャンネルの値をチャンネル番号の昇順に並べたもの (ビッグエンディアン)
+#              uint8 は 0-255、uint16 は 0-65535 を 0.0-1.0 に換算、float32 はそのまま (0.0-1.0 にクランプ)
+BINARY_UINT8 = 0x01
+BINARY_UINT16 = 0x02
+BINARY_FLOAT32 = 0x03
+BINARY_HEADER = struct.Struct(">BH")
+
+# 形式ごとの (値の構造体コード, 換算係数)
+_BINARY_FORMATS = {
+    BINARY_UINT8: ("B", 1.0 / 255),
+    BINARY_UINT16: ("H", 1.0 / 65535),
+    BINARY_FLOAT32: ("f", 1.0),
+}
+# (形式, 値の個数) -> (値部分の構造体, 換算係数)。フレームごとの構造体生成を避けるため事前に作成
+_BINARY_VALUE_STRUCTS = {
+    (value_format, count): (struct.Struct(f">{count}{code}"), scale)
+    for value_format, (code, scale) in _BINARY_FORMATS.items()
+    for count in range(1, CHANNEL_COUNT + 1)
+}
+# ビットマスク -> チャンネル番号のタプル (受信したマスクごとに遅延生成)
+_MASK_CHANNELS: Dict[int, tuple] = {}
+
+
+def encode_binary_frame(channel_values: Dict[int, float], value_format: int = BINARY_UINT8) -> bytes:
+    """
+    チャンネル値をバイナリフレームにエンコード (送信側・テスト用)
+    
+    Args:
+        channel_values: {channel: value} の辞書 (value は 0.0-1.0)
+        value_format: BINARY_UINT8 / BINARY_UINT16 / BINARY_FLOAT32
+    """
+    code, scale = _BINARY_FORMATS[value_format]
+    mask = 0
+    for channel in channel_values:
+        mask |= 1 << channel
+    channels = list(iter_channels(mask))
+    if value_format == BINARY_FLOAT32:
+        encoded = [float(channel_values[channel]) for channel in channels]
+    else:
+        encoded = [round(max(0.0, min(1.0, channel_values[channel])) / scale) for channel in channels]
+    return BINARY_HEADER.pack(value_format, mask) + struct.pack(f">{len(channels)}{code}", *encoded)
+
+
+class _PendingFrames:
+    """接続ごとの未処理フレーム (滞留分を最新値にまとめるためのバッファ)"""
+    
+    __slots__ = ("values", "mask", "frames", "received_ns", "parsed_ns", "ready", "closed")
+    
+    def __init__(self):
+        self.values = array('f', bytes(4 * CHANNEL_COUNT))
+        self.mask = 0
+        self.frames = 0
+        # まとめたフレームのうち最も古いものの受信時刻と、最新のものの解析完了時刻
+        self.received_ns = 0
+        self.parsed_ns = 0
+        self.ready = asyncio.Event()
+        self.closed = False
+
 
 class WebSocketServer:
     """WebSocketサーバークラス"""
@@ -20,20 +101,196 @@ class WebSocketServer:
         self.connected_clients: Set[WebSocketServerProtocol] = set()
         self.server = None
         self.is_running = False
+        # チャンネル直接解析 (set_channel_handler で設定)
+        self.channel_handler: Optional[Callable] = None
+        self.tag_mapper = None
+        # クライアントの接続・切断通知 (set_client_handlers で設定)
+        self.on_client_connect: Optional[Callable] = None
+        self.on_client_disconnect: Optional[Callable] = None
+        self._tag_cache: Dict[str, Optional[int]] = {}
+        self._tag_cache_version = -1
+        # 不正な入力の集計 (警告ログはレート制限)
+        self.invalid_fragments = 0
+        self.unknown_tags = 0
+        self._invalid_since_log = 0
+        self._unknown_since_log = 0
+        self._invalid_sample = ""
+        self._unknown_sample = ""
+        self._last_invalid_log = 0.0
+        # 滞留フレームの集約 (channel_handler 使用時のみ有効)
+        self.coalesce_frames = True
+        self.frames_received = 0
+        self.coalesced_frames = 0
+        # 接続数の上限 (0で無制限) とクライアントごとのレート制限 (0で無制限)
+        self.max_clients = 0
+        self.client_max_fps = 0.0
+        self.client_max_bytes_per_sec = 0.0
+        self.rate_limit_action = RATE_LIMIT_DROP
+        self.rejected_clients = 0
+        # ハンドシェイクを受け付けた接続数 (ハンドシェイク中の接続も含めて上限と比較する)
+        self._admitted_clients = 0
+        self.throttled_frames = 0
+        self.rate_dropped_frames = 0
+        # 処理時間 (set_metrics で登録するまでは集計のみ)
+        self.metrics: Optional[Metrics] = None
+        self.parse_time = Histogram()
+        self.handler_time = Histogram()
+        # 受信から送信までの遅延計測 (ブリッジが設定)
+        self.latency: Optional[LatencyTracker] = None
+        # 受信トラフィックの記録 (ブリッジが設定) と接続ごとのクライアントID
+        self.capture: Optional[CaptureWriter] = None
+        self._next_client_id = 0
     
     def set_message_handler(self, handler: Callable) -> None:
         """メッセージハンドラーを設定"""
         self.message_handler = handler
     
+    def set_channel_handler(self, tag_mapper, handler: Callable) -> None:
+        """
+        チャンネル直接解析のハンドラーを設定
+        
+        設定すると受信メッセージは {tag: strength} の辞書を経由せず、
+        tag_mapper でチャンネル番号に解決して handler(mask, values) を呼び出す。
+        
+        Args:
+            tag_mapper: get_channel_for_tag() と mapping_version を持つオブジェクト (Config)
+            handler: async handler(mask: int, values, client) 。values はチャンネル番号で引ける配列、
+                client は送信元の接続
+        """
+        self.tag_mapper = tag_mapper
+        self.channel_handler = handler
+        self._tag_cache.clear()
+        self._tag_cache_version = -1
+    
+    def set_client_handlers(self, on_connect: Optional[Callable], on_disconnect: Optional[Callable]) -> None:
+        """
+        クライアントの接続・切断時に呼び出すハンドラーを設定
+        
+        Args:
+            on_connect: on_connect(websocket) 。接続の登録直後に呼び出す
+            on_disconnect: on_disconnect(websocket) 。接続の解除直後に呼び出す
+        """
+        self.on_client_connect = on_connect
+        self.on_client_disconnect = on_disconnect
+    
+    @staticmethod
+    def get_request_path(websocket: WebSocketServerProtocol) -> str:
+        """接続時のリクエストパス (クエリを含む)"""
+        request = getattr(websocket, 'request', None)
+        return getattr(request, 'path', None) or getattr(websocket, 'path', '') or ''
+    
+    @staticmethod
+    def get_client_priority(websocket: WebSocketServerProtocol) -> int:
+        """
+        接続URLのクエリで指定されたクライアントの優先度を取得
+        
+        例: ws://localhost:3031/haptic?priority=10 (指定なし・不正な値は0)
+        """
+        try:
+            return int(parse_qs(urlsplit(WebSocketServer.get_request_path(websocket)).query).get('priority', ['0'])[0])
+        except ValueError:
+            return 0
+    
+    def configure_limits(self, max_clients: int, max_fps: float, max_bytes_per_sec: float, action: str) -> None:
+        """
+        接続数の上限とクライアントごとのレート制限を設定 (次の接続から適用)
+        
+        Args:
+            max_clients: 同時接続数の上限 (0で無制限)
+            max_fps: クライアントごとの受信フレーム数/秒の上限 (0で無制限)
+            max_bytes_per_sec: クライアントごとの受信バイト数/秒の上限 (0で無制限)
+            action: 上限を超えたフレームの扱い (drop: 破棄 / throttle: 受信を待たせる)
+        """
+        if action not in (RATE_LIMIT_DROP, RATE_LIMIT_THROTTLE):
+            logging.warning(f"不明なレート制限の動作: {action} ({RATE_LIMIT_DROP} を使用します)")
+            action = RATE_LIMIT_DROP
+        self.max_clients = max_clients
+        self.client_max_fps = max_fps
+        self.client_max_bytes_per_sec = max_bytes_per_sec
+        self.rate_limit_action = action
+    
+    def set_metrics(self, metrics: Metrics) -> None:
+        """受信関連のメトリクスを登録し、/metrics で出力する"""
+        self.metrics = metrics
+        metrics.counter_func("frames_received_total", "受信したフレーム数", lambda: self.frames_received)
+        metrics.counter_func("coalesced_frames_total", "まとめて処理を省略したフレーム数", lambda: self.coalesced_frames)
+        metrics.counter_func("invalid_fragments_total", "不正なフラグメント数", lambda: self.invalid_fragments)
+        metrics.counter_func("unknown_tags_total", "未設定のタグ数", lambda: self.unknown_tags)
+        metrics.counter_func("rejected_clients_total", "接続数の上限で拒否した接続数", lambda: self.rejected_clients)
+        metrics.counter_func("throttled_frames_total", "レート制限で待たせたフレーム数", lambda: self.throttled_frames)
+        metrics.counter_func("rate_dropped_frames_total", "レート制限で破棄したフレーム数", lambda: self.rate_dropped_frames)
+        metrics.gauge_func("websocket_clients", "接続中のクライアント数", self.get_client_count)
+        self.parse_time = metrics.histogram("parse_seconds", "受信フレームの解析時間")
+        self.handler_time = metrics.histogram("handler_seconds", "受信ハンドラーの処理時間")
+    
+    def _process_request(self, connection, request):
+        """
+        ハンドシェイク前のHTTPリクエスト処理
+        
+        /metrics にはメトリクスを返し、接続数の上限を超えた接続を拒否する
+        """
+        if self.metrics is not None and request.path.partition("?")[0] == METRICS_PATH:
+            response = connection.respond(HTTPStatus.OK, self.metrics.render())
+            del response.headers["Content-Type"]
+            response.headers["Content-Type"] = METRICS_CONTENT_TYPE
+            return response
+        if self.max_clients and self._admitted_clients >= self.max_clients:
+            self.rejected_clients += 1
+            logging.warning(f"接続数が上限 ({self.max_clients}) に達しているため接続を拒否しました: {connection.remote_address}")
+            return connection.respond(HTTPStatus.SERVICE_UNAVAILABLE, "Too many clients\n")
+        # 切断時 (ハンドシェイクに失敗した場合も含む) に枠を戻す
+        self._admitted_clients += 1
+        connection.connection_lost_waiter.add_done_callback(self._release_client_slot)
+        return None
+    
+    def _release_client_slot(self, _) -> None:
+        self._admitted_clients -= 1
+    
+    def _create_rate_limiter(self) -> Optional[ClientRateLimiter]:
+        """接続ごとのレート制限を作成 (制限なしの場合は None)"""
+        limiter = ClientRateLimiter(self.client_max_fps, self.client_max_bytes_per_sec)
+        return limiter if limiter.enabled else None
+    
+    async def _admit_frame(self, limiter: ClientRateLimiter, message) -> bool:
+        """
+        レート制限を適用してフレームを処理してよいか判定
+        
+        throttle の場合はトークンが貯まるまでこの接続の受信だけを待たせる。
+        サイズはテキストフレームでも UTF-8 のバイト数で数える (バイト数の制限がない場合は数えない)。
+        """
+        size = 0
+        if limiter.bytes is not None:
+            size = len(message.encode()) if isinstance(message, str) else len(message)
+        if self.rate_limit_action == RATE_LIMIT_THROTTLE:
+            wait = limiter.reserve(size)
+            if wait > 0:
+                self.throttled_frames += 1
+                await asyncio.sleep(wait)
+            return True
+        if limiter.try_acquire(size):
+            return True
+        self.rate_dropped_frames += 1
+        return False
+    
     async def register_client(self, websocket: WebSocketServerProtocol) -> None:
         """クライアント接続を登録"""
         self.connected_clients.add(websocket)
         logging.info(f"クライアント接続: {websocket.remote_address}")
+        if self.on_client_connect:
+            try:
+                self.on_client_connect(websocket)
+            except Exception as e:
+                logging.error(f"接続ハンドラーエラー: {e}")
     
     async def unregister_client(self, websocket: WebSocketServerProtocol) -> None:
         """クライアント接続を解除"""
         self.connected_clients.discard(websocket)
         logging.info(f"クライアント切断: {websocket.remote_address}")
+        if self.on_client_disconnect:
+            try:
+                self.on_client_disconnect(websocket)
+            except Exception as e:
+                logging.error(f"切断ハンドラーエラー: {e}")
     
     def parse_message(self, message: str) -> dict:
         """
@@ -71,6 +328,132 @@ class WebSocketServer:
         
         return result
     
+    def parse_channels(self, message: str, values) -> int:
+        """
+        受信メッセージを1パスで解析してチャンネル値を values に直接書き込む
+        
+        タグは tag_mapper で直接チャンネル番号に解決し (結果はタグ文字列ごとにキャッシュ)、
+        中間の {tag: strength} 辞書は作らない。不正な断片・未設定のタグは集計し、
+        警告ログは INVALID_LOG_INTERVAL 秒に1回にまとめる。
+        
+        Args:
+            message: "tag:strength" または "tag1:strength1;tag2:strength2" 形式
+            values: 書き込み先 (チャンネル番号で引ける配列)
+        
+        Returns:
+            値を書き込んだチャンネルのビットマスク
+        """
+        mapper = self.tag_mapper
+        cache = self._tag_cache
+        if self._tag_cache_version != mapper.mapping_version:
+            cache.clear()
+            self._tag_cache_version = mapper.mapping_version
+        
+        mask = 0
+        for command in message.split(';'):
+            tag, sep, strength_text = command.partition(':')
+            if not sep:
+                # 空の断片 (末尾の ";" など) は無視
+                if command and not command.isspace():
+                    self._count_invalid(command)
+                continue
+            
+            channel = cache.get(tag, _UNRESOLVED)
+            if channel is _UNRESOLVED:
+                channel = mapper.get_channel_for_tag(tag.strip())
+                if channel is not None and not (0 <= channel < CHANNEL_COUNT):
+                    channel = None
+                if len(cache) >= TAG_CACHE_LIMIT:
+                    cache.clear()
+                cache[tag] = channel
+            
+            try:
+                # float() は前後の空白を許容するので strip は不要
+                strength = float(strength_text)
+            except ValueError:
+                self._count_invalid(command)
+                continue
+            
+            if channel is None:
+                self._count_unknown(tag)
+                continue
+            
+            # 0.0-1.0の範囲にクランプ
+            if not (0.0 <= strength <= 1.0):
+                strength = max(0.0, min(1.0, strength))
+            values[channel] = strength
+            mask |= 1 << channel
+        
+        if self._invalid_since_log or self._unknown_since_log:
+            self._report_invalid()
+        return mask
+    
+    def parse_binary(self, message: bytes, values) -> int:
+        """
+        バイナリフレームを解析してチャンネル値を values に直接書き込む
+        
+        Args:
+            message: バイナリフレーム (形式はモジュール先頭の BINARY_* を参照)
+            values: 書き込み先 (チャンネル番号で引ける配列)
+        
+        Returns:
+            値を書き込んだチャンネルのビットマスク (不正なフレームは0)
+        """
+        if len(message) < BINARY_HEADER.size:
+            self._count_invalid("<binary: 短すぎるフレーム>")
+            return 0
+        value_format, mask = BINARY_HEADER.unpack_from(message)
+        if not mask:
+            return 0
+        entry = _BINARY_VALUE_STRUCTS.get((value_format, mask.bit_count()))
+        if entry is None:
+            self._count_invalid(f"<binary: 不明な形式 {value_format}>")
+            return 0
+        value_struct, scale = entry
+        if len(message) != BINARY_HEADER.size + value_struct.size:
+            self._count_invalid("<binary: 長さ不一致>")
+            return 0
+        
+        channels = _MASK_CHANNELS.get(mask)
+        if channels is None:
+            channels = _MASK_CHANNELS[mask] = tuple(iter_channels(mask))
+        raw_values = value_struct.unpack_from(message, BINARY_HEADER.size)
+        if value_format == BINARY_FLOAT32:
+            for channel, strength in zip(channels, raw_values):
+                if not (0.0 <= strength <= 1.0):
+                    strength = max(0.0, min(1.0, strength))
+                values[channel] = strength
+        else:
+            # 整数形式は換算後も必ず 0.0-1.0 に収まる
+            for channel, raw in zip(channels, raw_values):
+                values[channel] = raw * scale
+        return mask
+    
+    def _count_invalid(self, fragment: str) -> None:
+        """不正な断片を集計"""
+        self.invalid_fragments += 1
+        self._invalid_since_log += 1
+        self._invalid_sample = fragment[:64]
+    
+    def _count_unknown(self, tag: str) -> None:
+        """未設定のタグを集計"""
+        self.unknown_tags += 1
+        self._unknown_since_log += 1
+        self._unknown_sample = tag.strip()[:64]
+    
+    def _report_invalid(self) -> None:
+        """不正な入力の警告ログ (INVALID_LOG_INTERVAL 秒に1回)"""
+        now = time.monotonic()
+        if now - self._last_invalid_log < INVALID_LOG_INTERVAL:
+            return
+        self._last_invalid_log = now
+        if self._invalid_since_log:
+            logging.warning(f"無効なコマンド形式: {self._invalid_since_log}件 (例: {self._invalid_sample})")
+            self._invalid_since_log = 0
+        if self._unknown_since_log:
+            logging.warning(f"未設定のタグ: {self._unknown_since_log}件 (例: {self._unknown_sample})")
+            self._unknown_since_log = 0
+    
     async def handle_client(self, websocket: WebSocketServerProtocol, path: str = "/haptic") -> None:
         """クライアント接続を処理"""
         # Check if the path is /haptic
@@ -80,10 +463,55 @@ class WebSocketServer:
             return
             
         await self.register_client(websocket)
+        # 接続ごとのチャンネル値バッファ (チャンネル直接解析用)
+        values = array('f', bytes(4 * CHANNEL_COUNT))
+        limiter = self._create_rate_limiter()
+        latency = self.latency
+        client_id = self._next_client_id
+        self._next_client_id += 1
+        capture = self.capture
+        if capture is not None:
+            capture.record(client_id, RECORD_CONNECT, self.get_request_path(websocket))
         
         try:
+            if self.channel_handler and self.coalesce_frames:
+                await self._receive_coalesced(websocket, limiter, client_id)
+                return
+            
             async for message in websocket:
-                logging.debug(f"受信メッセージ: {message}")
+                self.frames_received += 1
+                if capture is not None:
+                    capture.record_frame(client_id, message)
+                if limiter is not None and not await self._admit_frame(limiter, message):
+                    continue
+                if logging.root.isEnabledFor(logging.DEBUG):
+                    logging.debug(f"受信メッセージ: {message}")
+                
+                if self.channel_handler:
+                    start = time.perf_counter_ns()
+                    if isinstance(message, str):
+                        # タグをチャンネルに直接解決して書き込み
+                        mask = self.parse_channels(message, values)
+                    else:
+                        # バイナリフレームはチャンネルのビットマスクで直接指定
+                        mask = self.parse_binary(message, values)
+                    parsed = time.perf_counter_ns()
+                    self.parse_time.observe_ns(parsed - start)
+                    if latency is not None:
+                        latency.record_parse(parsed - start)
+                    if mask:
+                        if latency is not None:
+                            latency.mark_frame(start, parsed)
+                        try:
+                            await self.channel_handler(mask, values, websocket)
+                        except Exception as e:
+                            logging.error(f"メッセージハンドラーエラー: {e}")
+                        self.handler_time.observe_ns(time.perf_counter_ns() - parsed)
+                    continue
+                
+                if not isinstance(message, str):
+                    self._count_invalid("<binary>")
+                    continue
                 
                 # メッセージを解析
                 parsed_data = self.parse_message(message)
@@ -109,8 +537,83 @@ class WebSocketServer:
             # エラー時は5秒待機して再試行
             await asyncio.sleep(5)
         finally:
+            if capture is not None:
+                capture.record(client_id, RECORD_DISCONNECT)
             await self.unregister_client(websocket)
     
+    async def _receive_coalesced(self, websocket: WebSocketServerProtocol,
+                                 limiter: Optional[ClientRateLimiter] = None, client_id: int = 0) -> None:
+        """
+        受信フレームを最新値にまとめながら処理
+        
+        受信ループは受信済みのフレームがある間は中断せずに読み続けるため、
+        バースト時に滞留したフレームはすべて1つのバッファ (チャンネルごとの最新値) に
+        書き込まれ、処理タスクが次に動いたときに1回の channel_handler 呼び出しで処理される。
+        途中の値は捨てられ、遅延は滞留量によらず1フレーム分に収まる。
+        """
+        pending = _PendingFrames()
+        latency = self.latency
+        capture = self.capture
+        processor = asyncio.create_task(self._process_pending(websocket, pending))
+        try:
+            async for message in websocket:
+                self.frames_received += 1
+                if capture is not None:
+                    capture.record_frame(client_id, message)
+                if limiter is not None and not await self._admit_frame(limiter, message):
+                    continue
+                if logging.root.isEnabledFor(logging.DEBUG):
+                    logging.debug(f"受信メッセージ: {message}")
+                start = time.perf_counter_ns()
+                if isinstance(message, str):
+                    mask = self.parse_channels(message, pending.values)
+                else:
+                    mask = self.parse_binary(message, pending.values)
+                parsed = time.perf_counter_ns()
+                self.parse_time.observe_ns(parsed - start)
+                if latency is not None:
+                    latency.record_parse(parsed - start)
+                if mask:
+                    if not pending.frames:
+                        pending.received_ns = start
+                    pending.parsed_ns = parsed
+                    pending.mask |= mask
+                    pending.frames += 1
+                    pending.ready.set()
+        finally:
+            # 切断前に受信した最後の値も処理してから終了
+            pending.closed = True
+            pending.ready.set()
+            if asyncio.current_task().cancelling():
+                processor.cancel()
+            else:
+                await processor
+    
+    async def _process_pending(self, websocket: WebSocketServerProtocol, pending: _PendingFrames) -> None:
+        """まとめたフレームを channel_handler に渡す (接続ごとの処理タスク)"""
+        # 受信側とバッファを入れ替えて使う (ハンドラー実行中の受信で値が書き換わらないように)
+        spare = array('f', bytes(4 * CHANNEL_COUNT))
+        while True:
+            await pending.ready.wait()
+            pending.ready.clear()
+            mask = pending.mask
+            if mask:
+                values = pending.values
+                pending.values, spare = spare, values
+                self.coalesced_frames += pending.frames - 1
+                pending.mask = 0
+                pending.frames = 0
+                if self.latency is not None:
+                    self.latency.mark_frame(pending.received_ns, pending.parsed_ns)
+                start = time.perf_counter_ns()
+                try:
+                    await self.channel_handler(mask, values, websocket)
+                except Exception as e:
+                    logging.error(f"メッセージハンドラーエラー: {e}")
+                self.handler_time.observe_ns(time.perf_counter_ns() - start)
+            if pending.closed:
+                return
+    
     async def start_server(self) -> None:
         """サーバーを開始"""
         try:
@@ -123,7 +626,8 @@ class WebSocketServer:
                 ping_timeout=30,   # 30秒のタイムアウト
                 close_timeout=30,  # 30秒のクローズタイムアウト
                 max_size=2**20,    # 1MBの最大メッセージサイズ
-                max_queue=1000     # 1000メッセージのキュー
+                max_queue=1000,    # 1000メッセージのキュー
+                process_request=self._process_request  # /metrics と接続数の上限
             )
             self.is_running = True
             logging.info(f"WebSocketサーバー開始: ポート {self.port}")
@@ -153,6 +657,18 @@ class WebSocketServer:
     def get_client_count(self) -> int:
         """接続中のクライアント数を取得"""
         return len(self.connected_clients)
+    
+    def get_input_stats(self) -> dict:
+        """受信フレーム数・集約したフレーム数・不正な入力・接続拒否・レート制限の集計を取得"""
+        return {
+            'invalid_fragments': self.invalid_fragments,
+            'unknown_tags': self.unknown_tags,
+            'frames_received': self.frames_received,
+            'coalesced_frames': self.coalesced_frames,
+            'rejected_clients': self.rejected_clients,
+            'throttled_frames': self.throttled_frames,
+            'rate_dropped_frames': self.rate_dropped_frames
+        }
 
 # テスト用のメッセージハンドラー
 async def test_message_handler(data: dict) -> None: